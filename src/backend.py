@@ -0,0 +1,26 @@
+#
+# Pin/clock backend selection
+#
+# Modules that touch pins, the clock or the serial console go through
+# `backend.active` instead of importing board, digitalio, time or supervisor
+# directly. On CircuitPython that is hardware_backend; anywhere the board
+# modules are missing (e.g. CPython on a Linux box) it is sim_backend, which
+# records every pin edge against a virtual clock. Call use() before creating
+# a Controller to pick a backend explicitly.
+#
+try:
+    import hardware_backend as active
+except (ImportError, NotImplementedError):
+    import sim_backend as active
+
+board = active.board
+
+
+def use(module):
+    """
+    params:
+    module: hardware_backend, sim_backend or any module with the same names
+    Selects the backend used by pins and timers created from now on.
+    """
+    global active
+    active = module
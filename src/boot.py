@@ -0,0 +1,10 @@
+# Runs once at power-up, before main.py. Enables the second USB serial port
+# (usb_cdc.data) that carries the binary segment stream, next to the console.
+import usb_cdc
+
+usb_cdc.enable(console=True, data=True)
+
+# To persist the command log (constant.LOG_FILE), make the filesystem writable
+# by the code. The drive is then read-only over USB until this is undone.
+# import storage
+# storage.remount("/", readonly=False)
@@ -1,32 +1,230 @@
+import struct
+import constant
+import backend
+from console_log import log
+
+#
+# Every logged command is one fixed-size binary slot:
+#   sequence number (u32, 0 for an empty slot), start time (u32, ms),
+#   duration (u32, ms), command length (u8), net signed steps per motor
+#   (i32, positive for a high DIR level, as in StepRecord), command text
+# little-endian, in a ring of constant.LOG_CAPACITY slots allocated once.
+# The persisted log file is the same ring, slot for slot.
+#
+SLOT_HEADER = "<IIIB"
+
+
+def slot_format(motor_count: int):
+    return SLOT_HEADER + "l" * motor_count + "%ds" % constant.LOG_COMMAND_BYTES
+
+
 class CommandLogger:
-    def __init__(self):
-        self.command_history = []
+    def __init__(self, motor_count: int=len(constant.MOTOR_ANCHORS),
+                 capacity: int=constant.LOG_CAPACITY, path=constant.LOG_FILE):
+        """
+        params:
+        motor_count: int, number of motors
+        capacity: int, commands kept; the oldest is overwritten by the next
+        path: str, file the log is persisted to, or None to keep it in RAM
+        A command is logged when it starts, and sealed (its steps and duration
+        filled in from its StepRecord) once the motion has come to rest, so
+        nothing is packed or written to flash while the motors run. The full
+        StepRecords of the last constant.UNDO_DEPTH commands are kept for undo.
+        """
+        self.motor_count = motor_count
+        self.capacity = capacity
+        self.layout = slot_format(motor_count)
+        self.slot_size = struct.calcsize(self.layout)
+        self.slots = bytearray(capacity * self.slot_size)
+        self.count = 0          # slots in use
+        self.next_seq = 1
+        self.unsealed = []      # (slot, sequence number, StepRecord) not sealed yet
+        self.records = []       # (sequence number, StepRecord), newest last
+        self.path = path
+        self.dirty = []         # slots changed since the last write to flash
+        if path is not None:
+            self.load()
 
-    def log_command(self, command_sequence):
+    def slot_index(self, index: int):
         """
-        Logs a command or sequence of commands.
+        Maps an index into the log (0 oldest, -1 newest) onto a slot.
         """
-        self.command_history.append(command_sequence)
-        print(f"Logged command: {command_sequence}")
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            return None
+        return (self.next_seq - self.count + index - 1) % self.capacity
+
+    def log_command(self, command_sequence, record=None):
+        """
+        Logs a command or sequence of commands, with the StepRecord of the
+        steps it issued. Overwrites the oldest entry once the log is full.
+        """
+        seq = self.next_seq
+        slot = (seq - 1) % self.capacity
+        text = command_sequence.encode()[:constant.LOG_COMMAND_BYTES]
+        start_ms = (backend.active.monotonic_ns() // 1_000_000) & 0xFFFFFFFF
+        struct.pack_into(self.layout, self.slots, slot * self.slot_size,
+                         seq, start_ms, 0, len(text), *([0] * self.motor_count), text)
+        self.next_seq += 1
+        self.count = min(self.count + 1, self.capacity)
+        self.mark_dirty(slot)
+        if record is not None:
+            self.unsealed.append((slot, seq, record))
+            self.records.append((seq, record))
+            if len(self.records) > constant.UNDO_DEPTH:
+                self.records.pop(0)
+
+    def seal(self):
+        """
+        Fills in the steps and durations of the commands logged since the
+        last call, then writes a batch to flash if enough have gathered. Only
+        call it at rest: a command still running would be sealed unfinished.
+        """
+        for slot, seq, record in self.unsealed:
+            offset = slot * self.slot_size
+            logged, start_ms, _, length = struct.unpack_from(SLOT_HEADER, self.slots, offset)
+            if logged != seq:
+                continue  # removed by undo, or overwritten since
+            duration_ms = 0
+            if record.start_ns is not None:
+                start_ms = (record.start_ns // 1_000_000) & 0xFFFFFFFF
+                duration_ms = (record.end_ns - record.start_ns) // 1_000_000
+            text = self.slots[offset + self.slot_size - constant.LOG_COMMAND_BYTES:offset + self.slot_size]
+            struct.pack_into(self.layout, self.slots, offset,
+                             seq, start_ms, duration_ms, length, *record.net_steps(), bytes(text))
+        self.unsealed = []
+        if len(self.dirty) >= constant.LOG_FLUSH_BATCH:
+            self.flush()
+
+    def entry(self, index: int=-1):
+        """
+        Returns (sequence number, start ms, duration ms, steps, command) of an
+        entry (0 oldest, -1 newest), or None.
+        """
+        slot = self.slot_index(index)
+        if slot is None:
+            return None
+        values = struct.unpack_from(self.layout, self.slots, slot * self.slot_size)
+        seq, start_ms, duration_ms, length = values[:4]
+        steps = values[4:4 + self.motor_count]
+        command = values[-1][:length].decode()
+        return seq, start_ms, duration_ms, steps, command
 
     def get_last_command(self):
         """
         Returns the last executed command sequence.
         """
-        if self.command_history:
-            return self.command_history[-1]
+        entry = self.entry(-1)
+        if entry is not None:
+            return entry[4]
         return None
 
+    def get_last_record(self):
+        """
+        Returns the StepRecord of the last executed command sequence, or None
+        once it is older than the UNDO_DEPTH commands kept.
+        """
+        if self.records and self.records[-1][0] == self.next_seq - 1:
+            return self.records[-1][1]
+        return None
+
+    def drop_records(self):
+        """
+        Forgets the StepRecords kept for undo, after motion that no command
+        recorded (a velocity jog or a binary stream) has moved the robot:
+        undoing a command from there would not retrace it.
+        """
+        self.records = []
+
     def get_history(self):
         """
-        Returns the full command history.
+        Returns the logged command sequences, oldest first.
         """
-        return self.command_history
+        return [self.entry(i)[4] for i in range(self.count)]
 
     def clear_last_command(self):
         """
         Removes the last command from history.
         """
-        if self.command_history:
-            self.command_history.pop()
-            print("Last command removed from history.")
+        slot = self.slot_index(-1)
+        if slot is None:
+            return
+        seq = self.next_seq - 1
+        offset = slot * self.slot_size
+        self.slots[offset:offset + self.slot_size] = bytes(self.slot_size)
+        self.mark_dirty(slot)
+        if self.records and self.records[-1][0] == seq:
+            self.records.pop()
+        self.next_seq -= 1
+        self.count -= 1
+        log.info("Last command removed from history.")
+
+    def load_move(self, move, index: int=-1, reverse: bool=False):
+        """
+        params:
+        move: Move, filled with the entry's net steps at DEFAULT_STEP_DELAY
+        index: int, entry (0 oldest, -1 newest)
+        reverse: bool, flip every direction, to run the command backwards
+        Returns the logged command, or None when there is no such entry.
+        Replaying the net steps as one move retraces where the cables ended,
+        not the path taken to get there.
+        """
+        entry = self.entry(index)
+        if entry is None:
+            return None
+        for i, count in enumerate(entry[3]):
+            move.set(i, (count > 0) != reverse, abs(count), constant.DEFAULT_STEP_DELAY)
+        return entry[4]
+
+    def mark_dirty(self, slot: int):
+        if self.path is not None and slot not in self.dirty:
+            self.dirty.append(slot)
+
+    def flush(self):
+        """
+        Writes every slot changed since the last flush to the log file. On a
+        board whose filesystem is read-only to the code (the default, see
+        boot.py) the first failure turns persistence off.
+        """
+        if self.path is None or not self.dirty:
+            return
+        try:
+            try:
+                log_file = open(self.path, "r+b")
+            except OSError:
+                log_file = open(self.path, "w+b")
+            with log_file:
+                for slot in sorted(self.dirty):
+                    offset = slot * self.slot_size
+                    log_file.seek(offset)
+                    log_file.write(self.slots[offset:offset + self.slot_size])
+            self.dirty = []
+        except OSError as e:
+            log.warning("Command log not persisted (%s); keeping it in RAM only.", e)
+            self.path = None
+            self.dirty = []
+
+    def load(self):
+        """
+        Restores the log persisted by an earlier run. Slots are put back in
+        sequence order; a file from another capacity or motor count is ignored.
+        """
+        try:
+            with open(self.path, "rb") as log_file:
+                data = log_file.read()
+        except OSError:
+            return
+        if len(data) > len(self.slots) or len(data) % self.slot_size:
+            log.warning("Command log file does not match this log; starting a new one.")
+            return
+        last = 0
+        used = 0
+        for offset in range(0, len(data), self.slot_size):
+            seq = struct.unpack_from("<I", data, offset)[0]
+            if seq:
+                used += 1
+                last = max(last, seq)
+        self.slots[:len(data)] = data
+        self.next_seq = last + 1
+        self.count = min(used, self.capacity)
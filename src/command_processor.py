@@ -1,63 +1,141 @@
+import constant
 from controller import Controller
 from command_logger import CommandLogger
+from console_log import log
+from profiling import stats
+from planner import Planner
+from sequence_compiler import compile_waypoints
+from step_record import StepRecord
 
 class CommandProcessor:
     def __init__(self):
         self.controller = Controller()
-        self.logger = CommandLogger()
-        self.command_map = {
-            'w': self.controller.forward,
-            's': self.controller.backward,
-            'a': self.controller.left,
-            'd': self.controller.right,
-            'u': self.controller.up,
-            'n': self.controller.down
+        self.logger = CommandLogger(self.controller.move.motor_count)
+        self.command_modes = {
+            'w': "forward",
+            's': "backward",
+            'a': "left",
+            'd': "right",
+            'u': "up",
+            'n': "down"
         }
+        self.planner = Planner(self.controller)
 
     def execute_command(self, command_sequence):
         """
         Executes a sequence of commands if valid.
         """
         if not self.is_valid_sequence(command_sequence):
-            print("Invalid command sequence.")
+            log.warning("Invalid command sequence.")
+            log.drain()
             return
 
-        print(f"Executing sequence: {command_sequence}")
+        log.info("Executing sequence: %s", command_sequence)
+        stats.commands += 1
+        record = self.new_record()
+        self.logger.log_command(command_sequence, record)
+        self.run_sequence(command_sequence, record=record)
+        self.logger.seal()
+        self.controller.log_motors()
+        log.drain()
+
+    def run_sequence(self, command_sequence, mode=None, record=None):
+        """
+        params:
+        command_sequence: str, jog commands
+        mode: str, "polyline" or "net", defaults to constant.SEQUENCE_MODE
+        record: StepRecord to record the steps in, defaults to a new one
+        Compiles the sequence into the fewest straight lines covering it and
+        queues them in the look-ahead planner, so each line is solved once
+        and the lines blend into one continuous motion, then runs it to a stop.
+        Returns the StepRecord of the steps issued.
+        """
+        if record is None:
+            record = self.new_record()
+        for waypoint in self.compile_sequence(command_sequence, mode):
+            self.planner.add(waypoint, record)
+        self.planner.flush()
+        log.info("Current position after %s: %s\n", command_sequence, self.controller.current_position)
+        return record
+
+    def new_record(self):
+        return StepRecord(self.controller.move.motor_count)
+
+    def compile_sequence(self, command_sequence, mode=None):
+        """
+        Returns the end points of the straight lines that run the sequence
+        from the end of the planner's queued path, or none at all when one of
+        them would be on a cable anchor.
+        """
+        distance = constant.JOG_DISTANCE
+        vectors = []
         for command in command_sequence:
-            if command in self.command_map:
-                # calculate steps needed based on the command
-                # update movement dict
-                self.command_map[command]()
-                # update position
-        
-        self.logger.log_command(command_sequence)
+            dx, dy, dz = constant.MODE_VECTORS[self.command_modes[command]]
+            vectors.append((dx * distance, dy * distance, dz * distance))
+
+        mode = constant.SEQUENCE_MODE if mode is None else mode
+        waypoints = compile_waypoints(self.planner.queued_position(), vectors, mode)
+        for waypoint in waypoints:
+            if self.controller.on_anchor(waypoint):
+                log.warning("Sequence %s reaches a cable anchor; not run.", command_sequence)
+                return []
+        return waypoints
     
     def is_valid_sequence(self, command_sequence):
         """
         Checks if all commands in the sequence are valid.
         """
-        return all(cmd in self.command_map for cmd in command_sequence)
+        return all(cmd in self.command_modes for cmd in command_sequence)
     
     def reverse_last_command(self):
         """
-        Reverses the last executed command sequence and removes it from history.
-        """
-        last_command = self.logger.get_last_command()
-        if last_command:
-            reverse_sequence = ''.join(self.get_reverse_command(cmd) for cmd in reversed(last_command))
-            print(f"Reversing sequence: {reverse_sequence}")
-            for command in reverse_sequence:
-                if command in self.command_map:
-                    self.command_map[command]()
-            self.logger.clear_last_command()  # Remove last command from history
-        else:
-            print("No command to reverse.")
-    
-    def get_reverse_command(self, command):
+        Undoes the last executed command sequence and removes it from history.
+        The recorded steps are replayed backwards, so the robot returns
+        exactly to where the sequence started.
         """
-        Returns the reverse of a given command.
+        command, record = self.pop_last_record()
+        if record is None:
+            log.info("No command to reverse.")
+            log.drain()
+            return
+        log.info("Reversing sequence: %s", command)
+        for line in range(len(record.lines) - 1, -1, -1):
+            self.planner.add_replay(record, line)
+        self.planner.flush()
+        log.info("Current position after undo: %s\n", self.controller.current_position)
+        self.controller.log_motors()
+        log.drain()
+
+    def replay_logged(self, index: int=-1, reverse: bool=False):
         """
-        reverse_map = {
-            'w': 's', 's': 'w', 'a': 'd', 'd': 'a', 'u': 'n', 'n': 'u'
-        }
-        return reverse_map.get(command, command)
+        params:
+        index: int, log entry (0 oldest, -1 newest)
+        reverse: bool, run the entry's steps backwards
+        Runs a logged command's net steps again as one coordinated move,
+        straight through the executor: nothing is compiled, planned or solved.
+        """
+        controller = self.controller
+        command = self.logger.load_move(controller.move, index, reverse)
+        if command is None:
+            log.info("No such logged command.")
+            log.drain()
+            return
+        log.info("Replaying %ssequence: %s", "reversed " if reverse else "", command)
+        controller.count_steps(controller.planned_counts, controller.move)
+        controller.execute_move(controller.move)
+        controller.update_current_position(controller.position_from_steps(controller.current_position))
+        log.info("Current position after replay: %s\n", controller.current_position)
+        controller.log_motors()
+        log.drain()
+
+    def pop_last_record(self):
+        """
+        Returns (command sequence, StepRecord) of the last logged command and
+        removes it from history, or (None, None) when there is none.
+        """
+        command = self.logger.get_last_command()
+        if not command:
+            return None, None
+        record = self.logger.get_last_record()
+        self.logger.clear_last_command()  # Remove last command from history
+        return command, record
@@ -0,0 +1,68 @@
+import constant
+
+#
+# Levels, as in Python's logging module
+#
+DEBUG = 10      # verbose, per-motor output
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+
+class ConsoleLog:
+
+    def __init__(self, level: int=INFO, capacity: int=constant.CONSOLE_LOG_SIZE):
+        """
+        params:
+        level: int, messages below it are dropped on the spot
+        capacity: int, messages held before new ones are dropped
+        Console output that never blocks the motion: messages are kept with
+        their arguments unformatted and only formatted and printed by drain(),
+        which is called when the executor is idle. A message below the level
+        costs one comparison; hot paths test `verbose` before building
+        arguments at all.
+        """
+        self.capacity = capacity
+        self.messages = []      # (format, args), oldest first
+        self.dropped = 0
+        self.set_level(level)
+
+    def set_level(self, level: int):
+        self.level = level
+        self.verbose = level <= DEBUG
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if len(self.messages) >= self.capacity:
+            self.dropped += 1
+            return
+        self.messages.append((message, args))
+
+    def debug(self, message: str, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args):
+        self.log(ERROR, message, *args)
+
+    def drain(self):
+        """
+        Prints every message held. Call it only while the motors are at rest.
+        """
+        for message, args in self.messages:
+            print(message % args if args else message)
+        self.messages = []
+        if self.dropped:
+            print(f"({self.dropped} log messages dropped)")
+            self.dropped = 0
+
+
+log = ConsoleLog(LEVEL_NAMES[constant.CONSOLE_LOG_LEVEL])
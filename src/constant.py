@@ -1,4 +1,4 @@
-import board
+from backend import board
 import math
 
 # All units in CM
@@ -26,6 +26,7 @@ MOTOR_ANCHORS = [
             (46.0,  46.0,  36.0),  # Motor2 anchor
             (0,  46.0,  36.0),  # Motor3 anchor
 ]
+ANCHOR_CLEARANCE = 0.5  # cm, lines may not end closer than this to an anchor
 
 #
 # Stepper Motor Parameters
@@ -33,6 +34,58 @@ MOTOR_ANCHORS = [
 STEPS_PER_REV = 200       # Nemo 17
 DEFAULT_STEP_DELAY = 0.01 # Time (in seconds) between steps.
 
+#
+# Motion profile parameters
+#   "constant"  : every step at DEFAULT_STEP_DELAY (no ramp)
+#   "trapezoid" : constant acceleration up to the max velocity
+#   "scurve"    : jerk-limited acceleration up to the max velocity
+# Moves start and stop at the DEFAULT_STEP_DELAY rate, then ramp to cruise.
+#
+MOTION_PROFILE = "trapezoid"
+
+MOTOR_MAX_VELOCITY = {       # steps/s
+    "motor0": 400.0,
+    "motor1": 400.0,
+    "motor2": 400.0,
+    "motor3": 400.0,
+}
+MOTOR_MAX_ACCELERATION = {   # steps/s^2
+    "motor0": 800.0,
+    "motor1": 800.0,
+    "motor2": 800.0,
+    "motor3": 800.0,
+}
+MOTOR_MAX_JERK = {           # steps/s^3, only used by the "scurve" profile
+    "motor0": 8000.0,
+    "motor1": 8000.0,
+    "motor2": 8000.0,
+    "motor3": 8000.0,
+}
+
+#
+# Cartesian line moves: each line is split into segments short enough that
+# interpolating cable lengths linearly inside a segment stays within
+# LINE_TOLERANCE (cm) of the straight line. Smaller is straighter but costs
+# more square roots per move.
+#
+LINE_TOLERANCE = 0.01
+MAX_LINE_SEGMENTS = 200
+
+#
+# Cable lengths near the last pose solved are estimated from the Jacobian
+# there, without square roots, while the estimate is provably within
+# IK_TOLERANCE steps of the exact length and rounds to the same step.
+#
+IK_TOLERANCE = 0.25
+
+#
+# Lookup table of cable lengths written by util/step_calculator.py. Where the
+# last pose solved is more than a grid cell away, lengths are interpolated
+# from it instead. Without the file, every such length is solved exactly.
+#
+IK_TABLE_FILE = "ik_table.bin"
+IK_TABLE_RESOLUTION = 2.0  # cm grid spacing
+
 #
 # Direction constants, top down view facing the shaft
 #
@@ -44,6 +97,7 @@ DIR_CCW = True   # Counterclockwise
 # Spool Parameters
 SPOOL_DIAMETER = 5.0
 SPOOL_CIRCUMFERENCE = math.pi * SPOOL_DIAMETER
+STEPS_PER_CM = STEPS_PER_REV / SPOOL_CIRCUMFERENCE
 
 
 
@@ -53,69 +107,81 @@ MOTOR_SHORTEN_RELEASE = {
     "motor2": {"shorten": DIR_CCW, "release": DIR_CW},
     "motor3": {"shorten": DIR_CCW, "release": DIR_CW },
 }
-MODE_ACTIONS = {
-    "forward": {
-        "motor0": "shorten",  
-        "motor1": "release",  
-        "motor2": "release",  
-        "motor3": "shorten",  
-    },
-    "backward": {
-        "motor0": "release",  
-        "motor1": "shorten",  
-        "motor2": "shorten",  
-        "motor3": "release",  
-    },
-    "left": {
-        "motor0": "shorten",  
-        "motor1": "shorten",   
-        "motor2": "release",  
-        "motor3": "release",  
-    },
-    "right": {
-        "motor0": "release",  
-        "motor1": "release",   
-        "motor2": "shorten",  
-        "motor3": "shorten",  
-    },
-    "up": {
-        "motor0": "shorten",  
-        "motor1": "shorten",   
-        "motor2": "shorten",   
-        "motor3": "shorten",  
-    },
-    "down": {
-        "motor0": "release",  
-        "motor1": "release",  
-        "motor2": "release",  
-        "motor3": "release",  
-    },
+
+#
+# Jogs and look-ahead planning
+#
+JOG_DISTANCE = 5.0  # cm per jog command
+
+MODE_VECTORS = {
+    "forward":  (-1.0, 0.0, 0.0),
+    "backward": (1.0, 0.0, 0.0),
+    "left":     (0.0, -1.0, 0.0),
+    "right":    (0.0, 1.0, 0.0),
+    "up":       (0.0, 0.0, 1.0),
+    "down":     (0.0, 0.0, -1.0),
 }
 
+# How a typed sequence is compiled before it runs:
+#   "polyline": collinear jogs merge and back-and-forth jogs cancel, but the
+#               corners of the path are kept
+#   "net":      the whole sequence becomes one straight line to its end point
+SEQUENCE_MODE = "polyline"
+
+PLANNER_QUEUE_SIZE = 16    # moves the planner looks ahead over
+JUNCTION_DEVIATION = 0.05  # cm, how far a corner may be rounded at speed (as in GRBL)
+
+# Feed override, typed as e.g. "feed 150" while running: scales the cruise
+# velocity of the moves planned and of the rest of the line being run, as a
+# fraction of MOTOR_MAX_VELOCITY. Accelerations and jerk are never scaled.
+FEED_OVERRIDE_MIN = 0.1
+FEED_OVERRIDE_MAX = 2.0
+
+# Velocity jog, switched on and off by typing "v": the direction keys then act
+# as they are typed and drive the end effector at JOG_VELOCITY (times the feed
+# override) for as long as they are held, replanned every JOG_PERIOD. The
+# console sends no key releases, only repeats: a key counts as released once
+# no repeat of it has come for JOG_HOLD (JOG_HOLD_START after the first press,
+# which has to cover the keyboard's repeat delay).
+JOG_MODE_CHAR = "v"
+JOG_VELOCITY = 10.0       # cm/s
+JOG_ACCELERATION = 20.0   # cm/s^2, speeding up and slowing down alike
+JOG_PERIOD = 0.02         # s, control period: a key acts within one
+JOG_HOLD = 0.1            # s
+JOG_HOLD_START = 0.6      # s
+
+#
+# Cooperative runtime
+#
+# The step executor yields to the serial and planning tasks at least once per
+# control tick while moving, which bounds input latency.
+CONTROL_TICK = 0.01  # s
+ABORT_CHAR = "!"     # acted on as soon as it is received, like GRBL's realtime commands
+SEGMENT_BUFFER_SIZE = 8  # ready-to-run line segments the planner keeps ahead of the executor
+SEGMENT_LEAD = 0.1       # s of motion they may hold at most: a feed override acts within about this
 
-def build_move_dict(mode_name: str):
-    """
-    Given a mode_name (e.g. "forward"), build the final dictionary like:
-    {
-      "motor0": {"direction": DIR_CW or DIR_CCW, "delay": DEFAULT_STEP_DELAY},
-      "motor1": {...},
-      ...
-    }
-    """
-    move_dict = {}
-    for motor, action in MODE_ACTIONS[mode_name].items():
-        move_dict[motor] = {
-            "direction": MOTOR_SHORTEN_RELEASE[motor][action],
-            "delay": DEFAULT_STEP_DELAY
-        }
-    return move_dict
-
-
-MOVE_FORWARD  = build_move_dict("forward")
-MOVE_BACKWARD = build_move_dict("backward")
-MOVE_LEFT     = build_move_dict("left")
-MOVE_RIGHT    = build_move_dict("right")
-MOVE_UP       = build_move_dict("up")
-MOVE_DOWN     = build_move_dict("down")
+#
+# Binary segment stream (see serial_protocol.py), on the USB data port of the
+# board (enabled in boot.py) or a pseudo-terminal in the simulator
+#
+STREAM_CREDIT_BATCH = 4  # credits granted back to the host at a time while moving
 
+#
+# Command log (see command_logger.py): a ring of fixed-size binary records,
+# sealed and written to flash in batches only while the robot is at rest.
+# Persisting needs the filesystem writable by the code, which boot.py does
+# not do by default (it would make the drive read-only over USB).
+#
+LOG_CAPACITY = 64        # commands kept; the oldest is overwritten
+LOG_COMMAND_BYTES = 16   # command text kept per record, longer ones are cut
+UNDO_DEPTH = 8           # newest commands whose full StepRecord is kept for undo
+LOG_FILE = None          # e.g. "/command_log.bin" to persist the log
+LOG_FLUSH_BATCH = 8      # changed records gathered before a write to flash
 
+#
+# Console output (see console_log.py) is held while the robot moves and
+# printed once it is at rest. "debug" adds per-motor output; the level can
+# also be changed at runtime by typing e.g. "log debug".
+#
+CONSOLE_LOG_LEVEL = "info"
+CONSOLE_LOG_SIZE = 64      # messages held before new ones are dropped
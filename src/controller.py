@@ -1,7 +1,16 @@
-import time
 import math
+from array import array
 import constant
+from console_log import log
+from profiling import stats
+import ik_table
+import kinematics
+from motion_profile import MotionProfile, ScaledProfile
+from move import Move
+from planner import Planner
 from stepper_motor import StepperMotor
+from step_scheduler import StepScheduler
+from timing import EdgeTimer
 
 class Controller:
     def __init__(self):
@@ -14,7 +23,11 @@ class Controller:
                 index=pins["INDEX"],
                 dir_pin=pins["DIR_PIN"],
                 step_pin=pins["STEP_PIN"],
-                steps_per_rev=constant.STEPS_PER_REV
+                steps_per_rev=constant.STEPS_PER_REV,
+                profile_shape=constant.MOTION_PROFILE,
+                max_velocity=constant.MOTOR_MAX_VELOCITY[motor_name],
+                max_acceleration=constant.MOTOR_MAX_ACCELERATION[motor_name],
+                max_jerk=constant.MOTOR_MAX_JERK[motor_name]
             )
 
         # You can change this if you have a known home or start position 
@@ -23,7 +36,43 @@ class Controller:
         # Example anchor points for each motor’s cable origin.
         self.anchors = constant.MOTOR_ANCHORS
 
-    def move_motors(self, movement_dict):
+        # Deadline-based edge timing shared by all coordinated moves
+        self.timer = EdgeTimer()
+        self.scheduler = StepScheduler(self.motors, self.timer)
+
+        # Preallocated move and per-motor profiles, reused by every move
+        self.motor_names = list(self.motors.keys())
+        self.motor_list = list(self.motors.values())
+        self.move = Move(len(self.motor_list))
+        self.profiles = [None] * len(self.motor_list)
+
+        # Cable positions are kept in whole steps from the home position,
+        # positive for cable let out. step_counts follows the steps the motors
+        # actually took; planned_counts runs ahead to the end of the path
+        # solved so far. Each new target is rounded once against the home
+        # lengths, so the fraction of a step one move leaves carries into the
+        # next and no error builds up however long the session runs.
+        motor_count = len(self.motor_list)
+        self.home_lengths = [kinematics.cable_length(anchor, constant.INITIAL_POSITION)
+                             for anchor in self.anchors]
+        self.release = [bool(constant.MOTOR_SHORTEN_RELEASE[motor_name]["release"])
+                        for motor_name in self.motor_names]
+        self.step_counts = array("l", [0] * motor_count)
+        self.planned_counts = array("l", [0] * motor_count)
+
+        # Inverse kinematics cache: the last pose solved, its cable lengths and
+        # the cable-length Jacobian there (one unit vector per cable); see
+        # solve_targets()
+        self.pose = None
+        self.lengths = [0.0] * motor_count
+        self.units = [(0.0, 0.0, 0.0)] * motor_count
+        self.estimates = [0.0] * motor_count
+        self.targets = array("l", [0] * motor_count)
+        self.ik_table = ik_table.load_table(constant.IK_TABLE_FILE)
+        self.ik_estimated = 0   # poses taken from the Jacobian or the table
+        self.ik_solved = 0      # poses solved exactly
+
+    def move_motors(self, movement_dict, coordinated=True):
         """
         Drives the motors in parallel.
         movement_dict example:
@@ -31,34 +80,125 @@ class Controller:
               "motor0": {"direction": bool, "steps": int, "delay": float},
               ...
             }
+        The dict is copied into the preallocated Move and run by execute_move.
         """
-        max_steps = max(movement_dict[m]["steps"] for m in movement_dict)
-        steps_completed = {m: 0 for m in self.motors}
-
-        for _ in range(max_steps):
-            # First half-step
-            for motor_name, motor_obj in self.motors.items():
-                needed_steps = movement_dict[motor_name]["steps"]
-                direction    = movement_dict[motor_name]["direction"]
-                if steps_completed[motor_name] < needed_steps:
-                    motor_obj.dir_pin.value = direction
-                    motor_obj.step_pin.value = True
-
-            # Determine the minimum half-step delay among active motors
-            active_delays = []
-            for motor_name in self.motors:
-                if steps_completed[motor_name] < movement_dict[motor_name]["steps"]:
-                    active_delays.append(movement_dict[motor_name]["delay"])
-            half_step_delay = min(active_delays) if active_delays else 0
-            time.sleep(half_step_delay)
-
-            # Second half-step
-            for motor_name, motor_obj in self.motors.items():
-                if steps_completed[motor_name] < movement_dict[motor_name]["steps"]:
-                    motor_obj.step_pin.value = False
-                    steps_completed[motor_name] += 1
-
-            time.sleep(half_step_delay)
+        move = self.move.load_dict(movement_dict, self.motor_names)
+        self.count_steps(self.planned_counts, move)
+        self.execute_move(move, coordinated)
+
+    def execute_move(self, move, coordinated=True):
+        """
+        Runs a Move. Every motor is pulsed by the step scheduler at its own
+        rate. When `coordinated`, the rates are proportional to the step counts
+        so all motors start and finish together; otherwise each motor runs its
+        own profile from its own delay.
+        """
+        if move.max_steps() == 0:
+            return
+
+        if coordinated:
+            self.coordinated_profiles(move)
+        else:
+            for i, motor_obj in enumerate(self.motor_list):
+                self.profiles[i] = motor_obj.profile(move.delay[i]) if move.steps[i] else None
+        self.scheduler.run(move, self.profiles)
+        self.count_steps(self.step_counts, move)
+        stats.end_motion(self.timer)
+
+        if self.timer.overruns:
+            log.warning("Timing overrun: %s", self.timer.report())
+
+    def coordinated_profiles(self, move):
+        """
+        Fills self.profiles with a profile for every motor of the move and
+        returns it.
+        The move is planned for the master axis, the motor with max_steps steps;
+        every other motor is timed from the master's timeline scaled by
+        max_steps / steps, so all motors ramp, cruise and stop together. A motor
+        with `steps` steps runs steps / max_steps as fast as the master, so the
+        slowest-limited motor sets every master limit (start speed, cruise
+        speed, acceleration and jerk).
+        """
+        max_steps = move.max_steps()
+
+        start_velocity = max_velocity = acceleration = jerk = math.inf
+        for i, motor_obj in enumerate(self.motor_list):
+            steps = move.steps[i]
+            if steps == 0:
+                continue
+            ratio = max_steps / steps
+            start_velocity = min(start_velocity, ratio / (2 * move.delay[i]))
+            max_velocity = min(max_velocity, ratio * motor_obj.max_velocity)
+            acceleration = min(acceleration, ratio * motor_obj.max_acceleration)
+            jerk = min(jerk, ratio * motor_obj.max_jerk)
+
+        master = MotionProfile(
+            constant.MOTION_PROFILE,
+            start_velocity=start_velocity,
+            max_velocity=max_velocity,
+            acceleration=acceleration,
+            jerk=jerk
+        )
+
+        for i in range(move.motor_count):
+            steps = move.steps[i]
+            if steps == max_steps:
+                self.profiles[i] = master
+            elif steps > 0:
+                self.profiles[i] = ScaledProfile(master, max_steps, steps)
+            else:
+                self.profiles[i] = None
+        return self.profiles
+
+    def streamed_segment(self, move, profiles, duration_us: int, counts):
+        """
+        params:
+        move: Move, filled in place
+        profiles: list, filled with the profile of every motor
+        duration_us: int, how long the segment should take
+        counts: signed step count of every motor, positive for cable let out
+        Loads one host-planned segment of the binary stream and advances
+        planned_counts by it. Every motor steps at a constant rate, so all
+        finish together after duration_us, stretched if that would drive a
+        motor past its max velocity. Returns the master velocity the segment
+        can stop dead from, or None when it has no steps.
+        """
+        for i in range(move.motor_count):
+            count = counts[i]
+            move.set(i, self.release[i] if count > 0 else not self.release[i], abs(count),
+                     constant.DEFAULT_STEP_DELAY)
+        max_steps = move.max_steps()
+        if max_steps == 0:
+            return None
+        self.count_steps(self.planned_counts, move)
+
+        velocity = max_steps * 1_000_000 / max(duration_us, 1)
+        stop_velocity = acceleration = math.inf
+        for i, motor_obj in enumerate(self.motor_list):
+            steps = move.steps[i]
+            if steps == 0:
+                continue
+            ratio = max_steps / steps
+            velocity = min(velocity, ratio * motor_obj.max_velocity)
+            stop_velocity = min(stop_velocity, ratio / (2 * constant.DEFAULT_STEP_DELAY))
+            acceleration = min(acceleration, ratio * motor_obj.max_acceleration)
+
+        master = MotionProfile(
+            constant.MOTION_PROFILE,
+            start_velocity=velocity,
+            max_velocity=velocity,
+            acceleration=acceleration,
+            jerk=math.inf
+        )
+        for i in range(move.motor_count):
+            steps = move.steps[i]
+            if steps == max_steps:
+                profiles[i] = master
+            elif steps > 0:
+                profiles[i] = ScaledProfile(master, max_steps, steps)
+            else:
+                profiles[i] = None
+        return stop_velocity
 
     def update_current_position(self, new_position):
         """
@@ -66,52 +206,346 @@ class Controller:
         """
         self.current_position = new_position
 
-    def calculate_length(self, anchor, end_effector_pos):
+    def count_steps(self, counters, move, counts=None):
         """
-        Euclidean distance from an anchor point to the end effector.
+        params:
+        counters: array, per-motor signed step counts to update
+        move: Move, gives each motor's direction
+        counts: list, steps each motor took, defaults to the whole move
+        Adds the steps of a move to `counters`, positive for cable let out.
         """
-        ax, ay, az = anchor
-        ex, ey, ez = end_effector_pos
-        return math.sqrt((ex - ax)**2 + (ey - ay)**2 + (ez - az)**2)
+        for i in range(move.motor_count):
+            count = move.steps[i] if counts is None else counts[i]
+            counters[i] += count if bool(move.direction[i]) == self.release[i] else -count
 
-    def length_to_steps(self, length_diff):
+    def reset_plan(self):
         """
-        Convert a difference in cable length to how many motor steps are needed.
-        You must adjust spool_diameter for your spool geometry.
+        Forgets the steps solved but not taken, e.g. after an abort, so the
+        next path is solved from where the motors really are.
         """
+        self.planned_counts[:] = self.step_counts
 
-        revs = length_diff / constant.SPOOL_CIRCUMFERENCE
-        return int(abs(revs * constant.STEPS_PER_REV))
+    def solve_targets(self, position):
+        """
+        params:
+        position: (x, y, z)
+        Fills self.targets with the signed step count from home at which each
+        motor puts the end effector at `position`, and returns it.
+        Within a table cell of the last pose solved (or anywhere, without a
+        table), each cable length is estimated from the Jacobian there
+        without a square root. With u the cable's unit vector, d the
+        displacement, s = u.d and r = |d|^2 - s^2,
+            E = L + s + r / (2 (L + s))
+        Further away, it is interpolated from the lookup table (see ik_table),
+        or taken from the Jacobian all the same where the table ends.
+        The exact squared length Q costs no root either; one Newton step
+        E <- (E + Q / E) / 2 refines the estimate, which is then within
+        |E^2 - Q| / (E + sqrt(Q)) of the exact length. If that bound
+        exceeds IK_TOLERANCE steps, or could move the estimate across half a
+        step, the exact lengths are solved instead. Either way the targets
+        are the ones the exact lengths give.
+        """
+        started_ns = self.timer.monotonic_ns()
+        anchors = self.anchors
+        home_lengths = self.home_lengths
+        estimates = self.estimates
+        targets = self.targets
+        table = self.ik_table
+        motor_count = len(targets)
+        px, py, pz = position
+
+        near = False
+        if self.pose is not None:
+            dx, dy, dz = px - self.pose[0], py - self.pose[1], pz - self.pose[2]
+            d_squared = dx * dx + dy * dy + dz * dz
+            near = table is None or d_squared <= table.resolution * table.resolution
+
+        estimated = self.pose is not None or table is not None
+        if estimated:
+            for i in range(motor_count):
+                ax, ay, az = anchors[i]
+                ex, ey, ez = px - ax, py - ay, pz - az
+                estimate = None
+                if not near:
+                    estimate = table.length(ex, ey, ez)
+                if estimate is None and self.pose is not None:
+                    ux, uy, uz = self.units[i]
+                    s = ux * dx + uy * dy + uz * dz
+                    estimate = self.lengths[i] + s
+                    if estimate > 0:
+                        estimate += (d_squared - s * s) / (2.0 * estimate)
+                if estimate is None or estimate <= 0:
+                    estimated = False
+                    break
+
+                # One Newton step on E^2 = Q polishes the estimate
+                squared = ex * ex + ey * ey + ez * ez
+                estimate = 0.5 * (estimate + squared / estimate)
+                residual = abs(estimate * estimate - squared)
+                # sqrt(Q) >= E - residual / E, so E + sqrt(Q) >= 2 E - residual / E
+                floor = 2.0 * estimate - residual / estimate
+                if floor <= 0:
+                    estimated = False
+                    break
+                error = residual / floor * constant.STEPS_PER_CM
+                steps = (estimate - home_lengths[i]) * constant.STEPS_PER_CM
+                targets[i] = round(steps)
+                if error > constant.IK_TOLERANCE or abs(steps - targets[i]) > 0.5 - error:
+                    estimated = False
+                    break
+                estimates[i] = estimate
+
+        if estimated:
+            self.ik_estimated += 1
+        else:
+            self.ik_solved += 1
+            for i in range(motor_count):
+                estimates[i] = kinematics.cable_length(anchors[i], position)
+                targets[i] = round((estimates[i] - home_lengths[i]) * constant.STEPS_PER_CM)
+
+        # The Jacobian at the new pose follows from its lengths, again
+        # without a square root. On an anchor a cable has no direction: the
+        # pose is not kept, so the next one is solved from scratch.
+        pose = position
+        for i in range(motor_count):
+            ax, ay, az = anchors[i]
+            length = estimates[i]
+            if length < 1e-9:
+                pose = None
+                break
+            self.lengths[i] = length
+            self.units[i] = ((px - ax) / length, (py - ay) / length, (pz - az) / length)
+        self.pose = pose
+        stats.ik_calls += 1
+        stats.ik_ns += self.timer.monotonic_ns() - started_ns
+        return targets
+
+    def plan_steps(self, position, delay: float=constant.DEFAULT_STEP_DELAY):
+        """
+        params:
+        position: (x, y, z), where the move ends
+        delay: float, half delay of the start/stop speed of every motor
+        Loads self.move with the steps from the end of the planned path to
+        `position` and advances planned_counts there. Each motor's direction
+        follows the sign of its count. Only the cable lengths at `position`
+        are solved (see solve_targets); where the path ends is already known
+        in steps.
+        """
+        move = self.move
+        targets = self.solve_targets(position)
+        for i in range(move.motor_count):
+            target = targets[i]
+            delta = target - self.planned_counts[i]
+            self.planned_counts[i] = target
+            move.set(i, self.release[i] if delta > 0 else not self.release[i], abs(delta), delay)
+        return move
+
+    def next_step_time(self, i: int, velocity):
+        """
+        params:
+        i: int, motor index
+        velocity: (vx, vy, vz), cm/s of the end effector at the pose last
+            solved (see solve_targets)
+        Returns the seconds until motor i's next step is due at that
+        velocity, when its cable length crosses the half step beyond its
+        target, or None when the cable is not moving.
+        """
+        ux, uy, uz = self.units[i]
+        rate = (ux * velocity[0] + uy * velocity[1] + uz * velocity[2]) * constant.STEPS_PER_CM
+        if rate == 0.0:
+            return None
+        steps = (self.estimates[i] - self.home_lengths[i]) * constant.STEPS_PER_CM
+        if rate > 0:
+            return (self.targets[i] + 0.5 - steps) / rate
+        return (self.targets[i] - 0.5 - steps) / rate
+
+    def position_from_steps(self, guess):
+        """
+        params:
+        guess: (x, y, z), a nearby position, e.g. where the last move began
+        Returns the position step_counts put the end effector at: each cable
+        length is its home length plus the steps taken, and the position is
+        solved from the four lengths. Used after an interrupted move, so the
+        tracked position follows the steps really taken.
+        """
+        lengths = [self.home_lengths[i] + self.step_counts[i] / constant.STEPS_PER_CM
+                   for i in range(len(self.anchors))]
+        return kinematics.forward_kinematics(self.anchors, lengths, guess)
+
+    def on_anchor(self, position):
+        """
+        Tells whether `position` lies within ANCHOR_CLEARANCE of a cable
+        anchor, where no move may end.
+        """
+        for anchor in self.anchors:
+            if kinematics.cable_length(anchor, position) < constant.ANCHOR_CLEARANCE:
+                return True
+        return False
 
-    def generate_movement_dict_from_mode(self, new_position, mode_dict):
+    def move_to(self, x, y, z, tolerance=None):
+        """
+        Moves the end effector along a straight Cartesian line to (x, y, z),
+        starting and ending at standstill.
+        The line runs through a Planner, the same way as every line of a
+        command sequence: it is split into segments short enough to stay
+        within `tolerance` cm (constant.LINE_TOLERANCE by default), inverse
+        kinematics is solved at every segment end (see line_segments), and
+        the segments are streamed back-to-back on one velocity profile for the
+        whole line. Only Controller.jog() calls it, outside the runtime.
         """
-        For each motor in mode_dict, read the direction from mode_dict,
-        compute how many steps we need (based on the difference in cable length),
-        and keep the same delay from mode_dict.
+        new_position = (x, y, z)
+        if self.current_position == new_position:
+            return
+        if self.on_anchor(new_position):
+            log.warning("Target %s is on a cable anchor; not moving.", new_position)
+            return
+
+        planner = Planner(self, tolerance=tolerance)
+        planner.add(new_position)
+        planner.flush()
+
+    def move_by(self, dx, dy, dz, tolerance=None):
         """
-        movement_dict = {}
-        for i, motor_name in enumerate(sorted(self.motors.keys())):
-            anchor = self.anchors[i]
+        Moves the end effector by (dx, dy, dz) cm in a straight line; see move_to().
+        """
+        x, y, z = self.current_position
+        self.move_to(x + dx, y + dy, z + dz, tolerance)
 
-            # Get the direction and delay directly from the mode_dict:
-            direction = mode_dict[motor_name]["direction"]
-            delay     = mode_dict[motor_name]["delay"]
+    def stream_line(self, start, end, master, path_steps, tolerance=None, chain=False, record=None):
+        """
+        Streams the segments of the straight line start-end, timed by `master`
+        (a profile over `path_steps` path steps), without waiting for the last
+        step period to elapse. With `chain`, the line continues the deadline
+        chain of the previous one. Returns True once anything has been stepped
+        on the chain, i.e. when finish_stream() is due.
+        """
+        return self.stream_segments(self.line_segments(start, end, master, path_steps, tolerance),
+                                    chain, record)
 
-            # Figure out how many steps needed:
-            current_len = self.calculate_length(anchor, self.current_position)
-            target_len  = self.calculate_length(anchor, new_position)
-            length_diff = abs(target_len - current_len)   # ignore sign
+    def stream_segments(self, segments, chain=False, record=None):
+        """
+        params:
+        segments: generator loading self.move and self.profiles, e.g.
+            line_segments() or replay_segments()
+        chain: bool, continue the deadline chain of the previous stream
+        record: StepRecord, records every segment that runs
+        Runs every segment the generator loads, back to back; see stream_line().
+        """
+        for point in segments:
+            self.scheduler.run(self.move, self.profiles, chain=chain, finish=False)
+            self.count_steps(self.step_counts, self.move)
+            stats.sample_heap()
+            chain = True
+            if record is not None:
+                record.add_segment(self.move, self.profiles, point)
+        return chain
+
+    def line_segments(self, start, end, master, path_steps, tolerance=None):
+        """
+        Generator over the segments of the straight line start-end. For each
+        segment with steps to take, loads self.move and self.profiles (timed
+        by `master` over `path_steps` path steps) and yields the segment's end
+        point; the caller runs the move before resuming the generator. Step
+        counts run on from planned_counts (see plan_steps), so consecutive
+        lines hand their rounding over exactly.
+        """
+        if tolerance is None:
+            tolerance = constant.LINE_TOLERANCE
+        segments = kinematics.line_segment_count(
+            self.anchors, start, end, tolerance, constant.MAX_LINE_SEGMENTS)
+
+        move = self.move
+        span = path_steps / segments
+        offset = 0.0
+        for j in range(1, segments + 1):
+            point = end if j == segments else kinematics.lerp(start, end, j / segments)
+            self.plan_steps(point)
+
+            if move.max_steps() == 0 and j < segments:
+                # Nothing to step yet: fold this stretch into the next segment
+                continue
+
+            segment_end = j * span
+            for i in range(move.motor_count):
+                steps = move.steps[i]
+                self.profiles[i] = ScaledProfile(master, path_steps, steps, offset, segment_end - offset) if steps else None
+            yield point
+            offset = segment_end
+
+    def replay_segments(self, record, line, master, path_steps):
+        """
+        params:
+        record: StepRecord, steps a command issued
+        line: int, index of the recorded line
+        master: MotionProfile, profile over the replayed line
+        path_steps: int, master steps over the replayed line
+        Generator like line_segments() over a recorded line run backwards:
+        the segments come in reverse order with every step count inverted,
+        so each cable returns exactly to where the line started. Recorded
+        spans are scaled to `path_steps` so the master profile covers them.
+        No kinematics are solved.
+        """
+        move = self.move
+        motor_count = move.motor_count
+        first, last = record.line_range(line)
+        scale = path_steps / max(sum(record.spans[first:last]), 1e-9)
+        offset = 0.0
+        for j in range(last - 1, first - 1, -1):
+            for i in range(motor_count):
+                count = record.counts[j * motor_count + i]
+                move.set(i, count < 0, abs(count), constant.DEFAULT_STEP_DELAY)
+            self.count_steps(self.planned_counts, move)
+
+            span = record.spans[j] * scale
+            for i in range(motor_count):
+                steps = move.steps[i]
+                self.profiles[i] = ScaledProfile(master, path_steps, steps, offset, span) if steps else None
+            yield record.lines[line][0] if j == first else record.point(j - 1)
+            offset += span
+
+    def finish_stream(self):
+        """
+        Waits for the last step period of a stream of lines to elapse.
+        """
+        self.scheduler.finish()
+        stats.end_motion(self.timer)
+        if self.timer.overruns:
+            log.warning("Timing overrun: %s", self.timer.report())
 
-            steps = self.length_to_steps(length_diff)
+    def line_path_steps(self, start, end):
+        """
+        Length of the line start-end in path steps. The path is measured in
+        cable-step units, so a cable parallel to the path steps exactly as fast
+        as the path advances.
+        """
+        return max(1, math.ceil(kinematics.cable_length(start, end) * constant.STEPS_PER_CM))
 
-            movement_dict[motor_name] = {
-                "direction": direction,
-                "steps": steps,
-                "delay": delay
-            }
+    def line_limits(self, start, end, tolerance=None):
+        """
+        Returns (start_velocity, max_velocity, acceleration, jerk) of the path
+        along the straight line start-end, in path steps.
+        Motor i steps at most max_length_rate times as fast as the path, so
+        every path limit is the tightest motor limit divided by that rate.
+        Rounding to whole steps adds up to one step to each segment of `span`
+        path steps (see line_segments), so velocities are limited by the
+        rate (rate * span + 1) / span instead.
+        """
+        if tolerance is None:
+            tolerance = constant.LINE_TOLERANCE
+        segments = kinematics.line_segment_count(
+            self.anchors, start, end, tolerance, constant.MAX_LINE_SEGMENTS)
+        quantum = segments / self.line_path_steps(start, end)
+        start_velocity = max_velocity = acceleration = jerk = math.inf
+        for i, motor_obj in enumerate(self.motor_list):
+            rate = kinematics.max_length_rate(self.anchors[i], start, end)
+            if rate == 0:
+                continue
+            start_velocity = min(start_velocity, 1 / (2 * constant.DEFAULT_STEP_DELAY * (rate + quantum)))
+            max_velocity = min(max_velocity, motor_obj.max_velocity / (rate + quantum))
+            acceleration = min(acceleration, motor_obj.max_acceleration / rate)
+            jerk = min(jerk, motor_obj.max_jerk / rate)
+        return start_velocity, max_velocity, acceleration, jerk
 
-        return movement_dict
-    
     # ------------------------------------------------------------
     #    The coordinate system
     #      -x = forward, +x = backward,
@@ -119,185 +553,24 @@ class Controller:
     #      -z = down,    +z = up.
     # ------------------------------------------------------------
 
+    def jog(self, mode, distance=constant.JOG_DISTANCE):
+        """
+        params:
+        mode: str, a key of constant.MODE_VECTORS, e.g. "forward"
+        distance: float, cm to move
+        """
+        dx, dy, dz = constant.MODE_VECTORS[mode]
+        self.move_by(dx * distance, dy * distance, dz * distance)
+        log.info("Current position after %s: %s\n", mode, self.current_position)
+        self.log_motors()
+        log.drain()
 
-    # def forward(self, distance=5.0):
-    #     """
-    #     Moves the end effector "distance" forward (-X),
-    #     but uses the directions from constant.MOVE_FORWARD.
-    #     """
-    #     x, y, z = self.current_position
-    #     new_pos = (x - distance, y, z)
-
-    #     # Build a movement dict that uses constant.MOVE_FORWARD
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_FORWARD)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def backward(self, distance=5.0):
-    #     x, y, z = self.current_position
-    #     new_pos = (x + distance, y, z)
-
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_BACKWARD)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def left(self, distance=5.0):
-    #     x, y, z = self.current_position
-    #     new_pos = (x, y - distance, z)
-
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_LEFT)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def right(self, distance=5.0):
-    #     x, y, z = self.current_position
-    #     new_pos = (x, y + distance, z)
-
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_RIGHT)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def up(self, distance=5.0):
-    #     x, y, z = self.current_position
-    #     new_pos = (x, y, z + distance)
-
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_UP)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def down(self, distance=5.0):
-    #     x, y, z = self.current_position
-    #     new_pos = (x, y, z - distance)
-
-    #     movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_DOWN)
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_pos)
-
-    # def test_move_anywhere(self, x, y, z):
-    #     """
-    #     Move directly to (x, y, z), using the MOTOR_SHORTEN_RELEASE dictionary
-    #     in constant.py to decide which direction (CW or CCW) means spool-in or spool-out.
-    #     """
-    #     new_position = (x, y, z)
-    #     movement_dict = {}
-
-    #     for i, motor_name in enumerate(sorted(self.motors.keys())):
-    #         anchor = self.anchors[i]
-    #         current_len = self.calculate_length(anchor, self.current_position)
-    #         target_len  = self.calculate_length(anchor, new_position)
-    #         diff = target_len - current_len
-
-    #         # If diff > 0 => spool out => "release"; if diff < 0 => spool in => "shorten"
-    #         if diff > 0:
-    #             direction = constant.MOTOR_SHORTEN_RELEASE[motor_name]["release"]
-    #         else:
-    #             direction = constant.MOTOR_SHORTEN_RELEASE[motor_name]["shorten"]
-
-    #         steps = self.length_to_steps(abs(diff))
-
-    #         movement_dict[motor_name] = {
-    #             "direction": direction,
-    #             "steps": steps,
-    #             "delay": constant.DEFAULT_STEP_DELAY
-    #         }
-
-    #     self.move_motors(movement_dict)
-    #     self.update_current_position(new_position)
-
-    def forward(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x - distance, y, z)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_FORWARD)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        # Print how many steps each motor took
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        # Print the updated position
-        print(f"Current position after forward: {self.current_position}\n")
-
-
-    def backward(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x + distance, y, z)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_BACKWARD)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        print(f"Current position after backward: {self.current_position}\n")
-
-
-    def left(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x, y - distance, z)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_LEFT)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        print(f"Current position after left: {self.current_position}\n")
-
-
-    def right(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x, y + distance, z)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_RIGHT)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        print(f"Current position after right: {self.current_position}\n")
-
-
-    def up(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x, y, z + distance)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_UP)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        print(f"Current position after up: {self.current_position}\n")
-
-
-    def down(self, distance=5.0):
-        x, y, z = self.current_position
-        new_pos = (x, y, z - distance)
-
-        movement_dict = self.generate_movement_dict_from_mode(new_pos, constant.MOVE_DOWN)
-        self.move_motors(movement_dict)
-        self.update_current_position(new_pos)
-
-        for motor_name, move_info in movement_dict.items():
-            direction_str = "CCW" if move_info["direction"] else "CW"
-            print(f"Motor {motor_name} => {move_info['steps']} steps (direction: {direction_str})")
-
-        print(f"Current position after down: {self.current_position}\n")
-
+    def log_motors(self):
+        """
+        Logs every motor's step count from home, at the debug level only.
+        """
+        if not log.verbose:
+            return
+        for i, motor_name in enumerate(self.motor_names):
+            log.debug("%s: %d steps from home, cable %.3f cm", motor_name, self.step_counts[i],
+                      self.home_lengths[i] + self.step_counts[i] / constant.STEPS_PER_CM)
@@ -0,0 +1,90 @@
+import backend
+
+# RP2040 single-cycle IO block: writing a mask to GPIO_OUT_SET / GPIO_OUT_CLR
+# raises / lowers every pin in the mask in one bus write.
+SIO_BASE         = 0xD0000000
+SIO_GPIO_OUT_SET = 0x014
+SIO_GPIO_OUT_CLR = 0x018
+
+
+def gpio_number(pin):
+    """
+    params:
+    pin: instance of board.Pin
+    Returns the GPIO number of an RP2040 "GPn" pin, or None for other pins.
+    """
+    name = str(pin).split(".")[-1]
+    if name.startswith("GP") and name[2:].isdigit():
+        return int(name[2:])
+    return None
+
+
+class OutputPin:
+
+    def __init__(self, pin, value: bool=False):
+        """
+        params:
+        pin: instance of board.Pin
+        value: bool, initial output level
+        Digital output that remembers its level and only touches the hardware
+        when the level actually changes.
+        """
+        self.pin = pin
+        self.io = backend.active.digital_output(pin, value)
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if value != self._value:
+            self.io.value = value
+            self._value = value
+
+
+class StepPort:
+
+    def __init__(self, pins):
+        """
+        params:
+        pins: list of OutputPin, bit i of a mask selects pins[i]
+        Writes a group of step pins together. When the backend exposes the
+        RP2040 SIO registers, every pin in a mask changes with a single masked
+        port write, so simultaneous edges are truly simultaneous; otherwise the
+        pins are written one after another.
+        """
+        self.pins = pins
+        self.sio = None
+
+        numbers = [gpio_number(output.pin) for output in pins]
+        if None not in numbers:
+            self.sio = backend.active.port_range(SIO_BASE, SIO_GPIO_OUT_CLR + 4)
+
+        # Precomputed little-endian port words for every pin mask, so the hot
+        # loop never builds a bytes object.
+        self.port_words = []
+        for mask in range(1 << len(pins)):
+            word = 0
+            for i, number in enumerate(numbers):
+                if mask & (1 << i):
+                    word |= 1 << (number or 0)
+            self.port_words.append(word.to_bytes(4, "little"))
+
+    def write(self, mask: int, value: bool):
+        """
+        params:
+        mask: int, bit i selects pins[i]
+        value: bool, level to drive the selected pins to
+        """
+        if self.sio is not None:
+            offset = SIO_GPIO_OUT_SET if value else SIO_GPIO_OUT_CLR
+            self.sio[offset:offset + 4] = self.port_words[mask]
+            for i, output in enumerate(self.pins):
+                if mask & (1 << i):
+                    output._value = value
+        else:
+            for i, output in enumerate(self.pins):
+                if mask & (1 << i):
+                    output.value = value
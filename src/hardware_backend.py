@@ -0,0 +1,114 @@
+import gc
+import sys
+import time
+import board
+import digitalio
+import supervisor
+
+try:
+    import memorymap  # CircuitPython direct register access (RP2040)
+except ImportError:
+    memorymap = None
+
+try:
+    import usb_cdc  # second USB serial port for the binary stream, see boot.py
+except ImportError:
+    usb_cdc = None
+
+NAME = "hardware"
+
+# time.sleep() is only trusted for waits longer than this; shorter waits spin
+SPIN_THRESHOLD_NS = 2_000_000
+
+monotonic_ns = time.monotonic_ns
+sleep = time.sleep
+
+echo = True  # console input is echoed back, except while key_input() is on
+
+
+def mem_free():
+    """
+    Returns the free heap in bytes.
+    """
+    return gc.mem_free()
+
+
+def gc_collections():
+    """
+    CircuitPython does not count garbage collections; returns None so they
+    are inferred from the free heap going up.
+    """
+    return None
+
+
+def digital_output(pin, value: bool):
+    """
+    params:
+    pin: instance of board.Pin
+    value: bool, initial output level
+    Returns a digitalio output driving `pin`.
+    """
+    io = digitalio.DigitalInOut(pin)
+    io.direction = digitalio.Direction.OUTPUT
+    io.value = value
+    return io
+
+
+def port_range(start: int, length: int):
+    """
+    Returns a memorymap.AddressRange over [start, start + length), or None
+    when the board does not allow direct register access.
+    """
+    if memorymap is None:
+        return None
+    try:
+        return memorymap.AddressRange(start=start, length=length)
+    except (ValueError, NotImplementedError):
+        return None
+
+
+def read_input():
+    """
+    Returns the characters waiting on the USB serial console without
+    blocking ("" when there are none), echoing them back as input() would.
+    """
+    text = ""
+    while supervisor.runtime.serial_bytes_available:
+        text += sys.stdin.read(1)
+    if text and echo:
+        sys.stdout.write(text.replace("\r", "\r\n"))
+    return text
+
+
+def key_input(enabled: bool):
+    """
+    The serial console already delivers every key as it is typed; while
+    enabled (for the velocity jog) the keys are not echoed.
+    """
+    global echo
+    echo = not enabled
+
+
+def data_port():
+    return usb_cdc.data if usb_cdc is not None else None
+
+
+def read_data():
+    """
+    Returns the bytes waiting on the USB data port without blocking (b""
+    when there are none), or None when boot.py did not enable the port.
+    """
+    port = data_port()
+    if port is None:
+        return None
+    waiting = port.in_waiting
+    return port.read(waiting) if waiting else b""
+
+
+def write_data(data):
+    """
+    Sends bytes on the USB data port.
+    """
+    port = data_port()
+    if port is not None:
+        port.write(data)
@@ -0,0 +1,76 @@
+import struct
+from array import array
+
+# File layout, little-endian: this header, then nx * ny * nz unsigned 16-bit
+# lengths with z varying fastest
+MAGIC = b"IKT1"
+HEADER = "<4sHHHff"   # magic, nx, ny, nz, resolution (cm), scale (cm per unit)
+
+
+class IKTable:
+
+    def __init__(self, counts, resolution: float, scale: float, data):
+        """
+        params:
+        counts: (nx, ny, nz), grid nodes per axis
+        resolution: float, grid spacing in cm
+        scale: float, cm per table unit
+        data: array('H'), cable lengths in table units, z varying fastest
+        Cable length as a function of the offset (|dx|, |dy|, |dz|) of the end
+        effector from an anchor, sampled on a regular grid by
+        util/step_calculator.py. The length depends only on the offset, so
+        one table serves every cable. length() interpolates it trilinearly,
+        with no square root.
+        """
+        self.nx, self.ny, self.nz = counts
+        self.resolution = resolution
+        self.inverse = 1.0 / resolution
+        self.scale = scale
+        self.data = data
+
+    def length(self, dx: float, dy: float, dz: float):
+        """
+        Returns the interpolated cable length (in cm) at offset (dx, dy, dz)
+        from its anchor, or None outside the table.
+        """
+        fx = abs(dx) * self.inverse
+        fy = abs(dy) * self.inverse
+        fz = abs(dz) * self.inverse
+        ix, iy, iz = int(fx), int(fy), int(fz)
+        if ix >= self.nx - 1 or iy >= self.ny - 1 or iz >= self.nz - 1:
+            return None
+        tx, ty, tz = fx - ix, fy - iy, fz - iz
+
+        data = self.data
+        stride_y = self.nz
+        stride_x = self.ny * self.nz
+        i = ix * stride_x + iy * stride_y + iz
+        j = i + stride_y
+        c00 = data[i] + (data[i + 1] - data[i]) * tz
+        c01 = data[j] + (data[j + 1] - data[j]) * tz
+        i += stride_x
+        j += stride_x
+        c10 = data[i] + (data[i + 1] - data[i]) * tz
+        c11 = data[j] + (data[j + 1] - data[j]) * tz
+        c0 = c00 + (c01 - c00) * ty
+        c1 = c10 + (c11 - c10) * ty
+        return (c0 + (c1 - c0) * tx) * self.scale
+
+
+def load_table(path: str):
+    """
+    Reads a table written by util/step_calculator.py. Returns None when there
+    is no table at `path`, so the controller solves every length itself.
+    """
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return None
+    with file:
+        magic, nx, ny, nz, resolution, scale = struct.unpack(HEADER, file.read(struct.calcsize(HEADER)))
+        if magic != MAGIC:
+            raise ValueError(f"Not an IK table: {path}")
+        data = array("H", [0] * (nx * ny * nz))
+        if file.readinto(data) != 2 * len(data):
+            raise ValueError(f"Truncated IK table: {path}")
+    return IKTable((nx, ny, nz), resolution, scale, data)
@@ -0,0 +1,121 @@
+import math
+
+
+def cable_length(anchor, position):
+    """
+    Euclidean distance from an anchor point to the end effector.
+    """
+    ax, ay, az = anchor
+    ex, ey, ez = position
+    return math.sqrt((ex - ax)**2 + (ey - ay)**2 + (ez - az)**2)
+
+
+def lerp(start, end, fraction: float):
+    """
+    Point `fraction` of the way from start to end.
+    """
+    return (start[0] + fraction * (end[0] - start[0]),
+            start[1] + fraction * (end[1] - start[1]),
+            start[2] + fraction * (end[2] - start[2]))
+
+
+def distance_to_line(point, start, end):
+    """
+    Distance from `point` to the segment start-end.
+    """
+    dx, dy, dz = end[0] - start[0], end[1] - start[1], end[2] - start[2]
+    px, py, pz = point[0] - start[0], point[1] - start[1], point[2] - start[2]
+    length_sq = dx * dx + dy * dy + dz * dz
+    t = 0.0
+    if length_sq > 0:
+        t = max(0.0, min(1.0, (px * dx + py * dy + pz * dz) / length_sq))
+    return math.sqrt((px - t * dx)**2 + (py - t * dy)**2 + (pz - t * dz)**2)
+
+
+def max_length_rate(anchor, start, end):
+    """
+    Largest |d(cable length) / d(path length)| along the segment start-end.
+    It is the cosine between the path and the cable, which changes
+    monotonically along a straight line, so the maximum is at an endpoint.
+    """
+    length = cable_length(start, end)
+    if length == 0:
+        return 0.0
+    ux, uy, uz = ((end[i] - start[i]) / length for i in range(3))
+    rate = 0.0
+    for p in (start, end):
+        cable = cable_length(anchor, p)
+        if cable > 0:
+            rate = max(rate, abs(ux * (p[0] - anchor[0]) + uy * (p[1] - anchor[1]) + uz * (p[2] - anchor[2])) / cable)
+        else:
+            rate = 1.0
+    return rate
+
+
+def line_segment_count(anchors, start, end, tolerance: float, max_segments: int):
+    """
+    params:
+    anchors: list of (x, y, z), cable anchor points
+    start, end: (x, y, z), ends of the straight line
+    tolerance: float, allowed cable length error (in cm) from interpolating
+        each segment linearly in cable space
+    max_segments: int, upper bound on the number of segments
+    Returns how many equal segments the line needs. Along a line at distance d
+    from an anchor the cable length bends with curvature at most 1/d, so a
+    segment of length h deviates at most h^2 / (8 d) from its chord.
+    """
+    length = cable_length(start, end)
+    if length == 0:
+        return 1
+    closest = min(distance_to_line(anchor, start, end) for anchor in anchors)
+    if closest <= 0:
+        return max_segments
+    max_segment_length = math.sqrt(8.0 * tolerance * closest)
+    return max(1, min(max_segments, math.ceil(length / max_segment_length)))
+
+
+def forward_kinematics(anchors, lengths, guess):
+    """
+    Least-squares end effector position for the given cable lengths, by damped
+    Gauss-Newton iterations starting from `guess`. The damping keeps the
+    solve stable when the effector sits in the plane of the anchors, where the
+    cable lengths say nothing about z.
+    """
+    x, y, z = guess
+    for _ in range(4):
+        jtj = [[0.0] * 3 for _ in range(3)]
+        jtr = [0.0] * 3
+        for (ax, ay, az), length in zip(anchors, lengths):
+            d = (x - ax, y - ay, z - az)
+            dist = math.sqrt(d[0] ** 2 + d[1] ** 2 + d[2] ** 2) or 1e-9
+            row = [c / dist for c in d]
+            residual = dist - length
+            for i in range(3):
+                jtr[i] += row[i] * residual
+                for j in range(3):
+                    jtj[i][j] += row[i] * row[j]
+        for i in range(3):
+            jtj[i][i] += 1e-6
+        dx = solve3(jtj, jtr)
+        x, y, z = x - dx[0], y - dx[1], z - dx[2]
+    return (x, y, z)
+
+
+def solve3(m, v):
+    """
+    Solves the 3x3 system m * x = v by Cramer's rule.
+    """
+    def det(a):
+        return (a[0][0] * (a[1][1] * a[2][2] - a[1][2] * a[2][1])
+                - a[0][1] * (a[1][0] * a[2][2] - a[1][2] * a[2][0])
+                + a[0][2] * (a[1][0] * a[2][1] - a[1][1] * a[2][0]))
+    d = det(m)
+    if abs(d) < 1e-12:
+        return [0.0, 0.0, 0.0]
+    result = []
+    for col in range(3):
+        a = [row[:] for row in m]
+        for r in range(3):
+            a[r][col] = v[r]
+        result.append(det(a) / d)
+    return result
@@ -1,6 +1,7 @@
-import time
-import supervisor  # for checking serial input in CircuitPython
+import asyncio
+
 from command_processor import CommandProcessor
+from runtime import Runtime
 
 processor = CommandProcessor()
 
@@ -13,19 +14,13 @@ print("  d = right")
 print("  u = up")
 print("  n = down")
 print("  r = reverse last command")
+print("  ! = abort (acts immediately, no ENTER needed)")
+print("  feed 10..200 = feed override in percent, applied while moving")
+print("  v = velocity jog: hold w/s/a/d/u/n to move (no ENTER), v again to end")
+print("  stats = profiling counters, reset = clear them")
+print("  log debug|info|warning|error = console output level (debug adds per-motor lines)")
 print("Send one or multiple characters above, then press ENTER.")
+print("New commands are accepted while the robot is moving.")
+print("Host-planned paths stream over the binary data port, see util/stream_client.py.")
 
-while True:
-    # Only check input if there's something available
-    if supervisor.runtime.serial_bytes_available:
-        user_input = input().strip().lower()
-        
-        if user_input == 'r':
-            print("Reversing last command...")
-            processor.reverse_last_command()
-        else:
-            print(f"Processing command: {user_input}")
-            processor.execute_command(user_input)
-    
-    # Wait a short time before checking again
-    time.sleep(0.1)
\ No newline at end of file
+asyncio.run(Runtime(processor).run())
@@ -0,0 +1,329 @@
+import math
+
+PROFILE_CONSTANT  = "constant"
+PROFILE_TRAPEZOID = "trapezoid"
+PROFILE_SCURVE    = "scurve"
+
+
+class MotionProfile:
+
+    def __init__(self, shape: str, start_velocity: float, max_velocity: float,
+                 acceleration: float, jerk: float=None, end_velocity: float=None):
+        """
+        params:
+        shape: str, "constant", "trapezoid" or "scurve"
+        start_velocity: float, steps/s at the start of the move; for a move from
+            standstill, the speed the motor can start at without ramping
+        max_velocity: float, cruise steps/s
+        acceleration: float, maximum acceleration in steps/s^2
+        jerk: float, maximum jerk in steps/s^3, only used by "scurve"
+        end_velocity: float, steps/s at the end of the move, defaults to
+            start_velocity
+        Velocity profile of one axis. The acceleration ramp (from start_velocity)
+        and the deceleration ramp (to end_velocity) are precomputed as lists of
+        step periods; every step runs at the slowest of the two ramps and cruise,
+        so moves too short to reach cruise turn around where the ramps meet.
+        A move entered above its cruise velocity (after the feed override was
+        lowered) instead starts with a ramp down to cruise at `acceleration`.
+        """
+        if shape not in (PROFILE_CONSTANT, PROFILE_TRAPEZOID, PROFILE_SCURVE):
+            raise ValueError(f"Unknown motion profile: {shape}")
+        if end_velocity is None:
+            end_velocity = start_velocity
+
+        self.shape = shape
+        self.start_velocity = start_velocity
+        self.end_velocity = end_velocity
+        self.max_velocity = max(max_velocity, start_velocity, end_velocity)
+        self.acceleration = acceleration
+        self.jerk = jerk
+
+        if shape == PROFILE_CONSTANT:
+            self.ramp = self.decel_ramp = []
+            self.cruise_period = 1.0 / start_velocity
+        else:
+            build = self._trapezoid_ramp if shape == PROFILE_TRAPEZOID else self._scurve_ramp
+            slow_start = start_velocity > max(max_velocity, end_velocity)
+            if slow_start:
+                self.max_velocity = max(max_velocity, end_velocity)
+            self.cruise_period = 1.0 / self.max_velocity
+            self.ramp = self._slowdown_ramp(start_velocity) if slow_start else build(start_velocity)
+            self.decel_ramp = self.ramp if end_velocity == start_velocity else build(end_velocity)
+
+        # ramp_times[k] = time to complete the first k ramp steps
+        self.ramp_times = self._prefix_sums(self.ramp)
+        self.decel_times = self.ramp_times if self.decel_ramp is self.ramp else self._prefix_sums(self.decel_ramp)
+
+        # (total_steps, accel_steps, decel_steps) of the last move length asked for
+        self._split = (-1, 0, 0)
+
+    def _prefix_sums(self, ramp):
+        times = [0.0]
+        for period in ramp:
+            times.append(times[-1] + period)
+        return times
+
+    def _trapezoid_ramp(self, v0: float):
+        """
+        Step periods under constant acceleration: v_k = sqrt(v0^2 + 2*a*k).
+        """
+        ramp = []
+        v0_squared = v0 ** 2
+        velocity = v0
+        while velocity < self.max_velocity:
+            ramp.append(1.0 / velocity)
+            velocity = math.sqrt(v0_squared + 2.0 * self.acceleration * len(ramp))
+        return ramp
+
+    def _slowdown_ramp(self, v0: float):
+        """
+        Step periods under constant deceleration from v0 down to cruise:
+        v_k = sqrt(v0^2 - 2*a*k). Each period only grows, like the
+        deceleration ramp, so the ramps still cross once.
+        """
+        ramp = []
+        v0_squared = v0 ** 2
+        velocity = v0
+        while velocity > self.max_velocity:
+            ramp.append(1.0 / velocity)
+            velocity = math.sqrt(max(v0_squared - 2.0 * self.acceleration * len(ramp), 0.0))
+        return ramp
+
+    def _scurve_ramp(self, v0: float):
+        """
+        Step periods under jerk-limited acceleration. Acceleration rises at
+        `jerk`, holds at `acceleration` if the velocity change allows it, then
+        falls back to zero as the velocity reaches cruise.
+        """
+        dv = self.max_velocity - v0
+        jerk = self.jerk
+        if dv >= self.acceleration ** 2 / jerk:
+            t_jerk = self.acceleration / jerk
+            t_const = dv / self.acceleration - t_jerk
+        else:
+            t_jerk = math.sqrt(dv / jerk)
+            t_const = 0.0
+        a_peak = jerk * t_jerk
+        t_total = 2.0 * t_jerk + t_const
+
+        ramp = []
+        t = 0.0
+        velocity = v0
+        while t < t_total:
+            period = 1.0 / velocity
+            ramp.append(period)
+            t += period
+            if t < t_jerk:
+                velocity = v0 + 0.5 * jerk * t * t
+            elif t < t_jerk + t_const:
+                velocity = v0 + 0.5 * jerk * t_jerk * t_jerk + a_peak * (t - t_jerk)
+            else:
+                remaining = max(t_total - t, 0.0)
+                velocity = self.max_velocity - 0.5 * jerk * remaining * remaining
+        return ramp
+
+    def _accel_period(self, step_index: int):
+        return self.ramp[step_index] if step_index < len(self.ramp) else self.cruise_period
+
+    def _decel_period(self, steps_left: int):
+        # Beyond its ramp the deceleration sets no bound: cruise is part of
+        # the acceleration side, which a slowdown ramp starts below
+        return self.decel_ramp[steps_left] if steps_left < len(self.decel_ramp) else 0.0
+
+    def _accel_decel_split(self, total_steps: int):
+        """
+        Returns (accel_steps, decel_steps): how many leading steps follow the
+        acceleration ramp and how many trailing steps the deceleration ramp.
+        The acceleration period only shrinks and the deceleration period only
+        grows along the move, so they cross once; found by bisection and
+        cached per move length.
+        """
+        if self._split[0] == total_steps:
+            return self._split[1], self._split[2]
+
+        accel_len = len(self.ramp)
+        decel_len = len(self.decel_ramp)
+        if accel_len + decel_len <= total_steps:
+            accel_steps, decel_steps = accel_len, decel_len
+        else:
+            # First step governed by the deceleration ramp
+            low, high = 0, total_steps
+            while low < high:
+                mid = (low + high) // 2
+                if self._decel_period(total_steps - 1 - mid) > self._accel_period(mid):
+                    high = mid
+                else:
+                    low = mid + 1
+            accel_steps, decel_steps = low, total_steps - low
+
+        self._split = (total_steps, accel_steps, decel_steps)
+        return accel_steps, decel_steps
+
+    def step_period(self, step_index: int, total_steps: int):
+        """
+        params:
+        step_index: int, index of the step within the move, starting from 0
+        total_steps: int, number of steps in the move
+        Returns the full period (in seconds) of the given step.
+        """
+        accel = self._accel_period(step_index)
+        decel = self._decel_period(total_steps - 1 - step_index)
+        return accel if accel > decel else decel
+
+    def time_at(self, position: float, total_steps: int):
+        """
+        params:
+        position: float, steps completed so far (may be fractional)
+        total_steps: int, number of steps in the move
+        Returns the time (in seconds) after the start of the move at which
+        `position` is reached. Runs in constant time using the ramp prefix sums.
+        """
+        step_index = int(position)
+        if step_index >= total_steps:
+            step_index = total_steps
+            fraction = 0.0
+        else:
+            fraction = position - step_index
+
+        accel_steps, decel_steps = self._accel_decel_split(total_steps)
+        decel_start = total_steps - decel_steps
+
+        t = self.ramp_times[min(step_index, accel_steps)]
+        if step_index > accel_steps:
+            t += self.cruise_period * (min(step_index, decel_start) - accel_steps)
+        if step_index > decel_start:
+            t += self.decel_times[decel_steps] - self.decel_times[total_steps - step_index]
+        if fraction:
+            t += fraction * self.step_period(step_index, total_steps)
+        return t
+
+    def duration(self, total_steps: int):
+        """
+        Returns the time (in seconds) a move of `total_steps` steps takes.
+        """
+        return self.time_at(total_steps, total_steps)
+
+    def position_at(self, time: float, total_steps: int):
+        """
+        params:
+        time: float, seconds after the start of the move
+        total_steps: int, number of steps in the move
+        Returns the (fractional) position reached at `time`; the inverse of
+        time_at(), found by bisection.
+        """
+        low, high = 0.0, float(total_steps)
+        for _ in range(40):
+            mid = 0.5 * (low + high)
+            if self.time_at(mid, total_steps) < time:
+                low = mid
+            else:
+                high = mid
+        return high
+
+
+class StoppingProfile:
+
+    def __init__(self, master: MotionProfile, master_steps: int, position: float,
+                 stop_velocity: float=None, velocity: float=None):
+        """
+        params:
+        master: MotionProfile, profile the move was following
+        master_steps: int, number of steps in the move
+        position: float, position at which the stop begins
+        stop_velocity: float, steps/s the axis can stop dead from, defaults to
+            the slower of the master's start and end velocities
+        velocity: float, steps/s at `position`, defaults to the master's;
+            given when a stop begun in one move carries on into the next
+        Follows `master` up to `position`, then decelerates at the master's
+        acceleration down to stop_velocity. stop_position is where that happens.
+        It stands in for the master of every ScaledProfile of the move, so all
+        axes ramp down together and stay coordinated.
+        """
+        self.master = master
+        self.master_steps = master_steps
+        self.position = position
+        self.acceleration = master.acceleration
+        self.start_time = master.time_at(position, master_steps)
+
+        if velocity is None:
+            step_index = min(int(position), master_steps - 1)
+            velocity = 1.0 / master.step_period(step_index, master_steps)
+        self.velocity = velocity
+        if stop_velocity is None:
+            stop_velocity = min(master.start_velocity, master.end_velocity)
+        self.stop_velocity = min(stop_velocity, self.velocity)
+        self.decel_distance = 0.0
+        if master.shape != PROFILE_CONSTANT:
+            self.decel_distance = (self.velocity ** 2 - self.stop_velocity ** 2) / (2.0 * self.acceleration)
+        self.decel_time = (self.velocity - self.stop_velocity) / self.acceleration
+        self.stop_position = position + self.decel_distance
+
+    def time_at(self, position: float, total_steps: int):
+        """
+        Returns the time (in seconds) after the start of the move at which
+        `position` is reached. A step already under way at stop_position
+        finishes at the stop velocity.
+        """
+        if position <= self.position:
+            return self.master.time_at(position, self.master_steps)
+        distance = position - self.position
+        if distance >= self.decel_distance:
+            return (self.start_time + self.decel_time
+                    + (distance - self.decel_distance) / self.stop_velocity)
+        velocity_squared = self.velocity ** 2 - 2.0 * self.acceleration * distance
+        return self.start_time + (self.velocity - math.sqrt(velocity_squared)) / self.acceleration
+
+    def step_period(self, step_index: int, total_steps: int):
+        """
+        Returns the full period (in seconds) of the given step.
+        """
+        return self.time_at(step_index + 1, total_steps) - self.time_at(step_index, total_steps)
+
+    def velocity_at(self, position: float):
+        """
+        Returns the velocity (in steps/s) at a position past the start of the stop.
+        """
+        distance = position - self.position
+        if distance >= self.decel_distance:
+            return self.stop_velocity
+        return math.sqrt(self.velocity ** 2 - 2.0 * self.acceleration * distance)
+
+
+class ScaledProfile:
+
+    def __init__(self, master: MotionProfile, master_steps: int, steps: int,
+                 offset: float=0.0, span: float=None):
+        """
+        params:
+        master: MotionProfile, profile of the master axis (or path)
+        master_steps: int, number of steps the master takes over the whole move
+        steps: int, number of steps this axis takes
+        offset: float, master position at which this axis starts its steps
+        span: float, master steps covered by this axis' steps, defaults to
+            master_steps
+        Times the steps of a minor axis from the master timeline: step k spans
+        master positions offset + k * span / steps to offset + (k + 1) * span / steps,
+        so the axis moves in exact proportion to the master and finishes with
+        it. offset and span let one segment of a longer move follow the
+        master profile of the whole move.
+        """
+        self.master = master
+        self.master_steps = master_steps
+        self.offset = offset
+        self.span = master_steps if span is None else span
+        self.ratio = self.span / steps
+
+    def step_period(self, step_index: int, total_steps: int):
+        """
+        Returns the full period (in seconds) of the given step.
+        """
+        start = self.offset + step_index * self.ratio
+        return (self.master.time_at(start + self.ratio, self.master_steps)
+                - self.master.time_at(start, self.master_steps))
+
+    def duration(self, total_steps: int):
+        """
+        Returns the time (in seconds) a move of `total_steps` steps takes.
+        """
+        return (self.master.time_at(self.offset + self.span, self.master_steps)
+                - self.master.time_at(self.offset, self.master_steps))
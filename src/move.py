@@ -0,0 +1,53 @@
+from array import array
+
+
+class Move:
+
+    def __init__(self, motor_count: int):
+        """
+        params:
+        motor_count: int, number of motors, indexed from 0
+        Preallocated, array-backed description of one coordinated move, indexed
+        by motor index. The planner fills it in place and the executor only
+        reads it, so planning and running a move build no dicts or lists.
+        """
+        self.motor_count = motor_count
+        self.steps = array("l", [0] * motor_count)       # unsigned step count
+        self.direction = array("b", [0] * motor_count)   # DIR_CW (0) / DIR_CCW (1)
+        self.delay = array("f", [0.0] * motor_count)     # half delay of the start/stop speed
+
+    def set(self, index: int, direction: bool, steps: int, delay: float):
+        """
+        Fills the entry of one motor.
+        """
+        self.direction[index] = direction
+        self.steps[index] = steps
+        self.delay[index] = delay
+
+    def copy_from(self, other):
+        """
+        Copies every motor entry of another Move in place.
+        """
+        for i in range(self.motor_count):
+            self.steps[i] = other.steps[i]
+            self.direction[i] = other.direction[i]
+            self.delay[i] = other.delay[i]
+        return self
+
+    def max_steps(self):
+        """
+        Returns the step count of the motor that moves the most.
+        """
+        return max(self.steps)
+
+    def load_dict(self, movement_dict, motor_names):
+        """
+        params:
+        movement_dict: dict, motor name -> {"direction": bool, "steps": int, "delay": float}
+        motor_names: list of str, motor names in index order
+        Fills the move from the dict format used by Controller.move_motors.
+        """
+        for i, motor_name in enumerate(motor_names):
+            move_info = movement_dict[motor_name]
+            self.set(i, move_info["direction"], move_info["steps"], move_info["delay"])
+        return self
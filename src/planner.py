@@ -0,0 +1,321 @@
+import math
+import constant
+import kinematics
+from motion_profile import MotionProfile, PROFILE_CONSTANT, PROFILE_SCURVE
+
+
+class Block:
+
+    def __init__(self, start, end, path_steps: int, limits, record=None, replay=None,
+                 feed_override: float=1.0):
+        """
+        params:
+        start, end: (x, y, z), ends of the straight line
+        path_steps: int, length of the line in path steps
+        limits: (start_velocity, max_velocity, acceleration, jerk) of the path
+            in path steps, from Controller.line_limits
+        record: StepRecord, records the steps the block issues
+        replay: (StepRecord, line index), runs that recorded line backwards
+            instead of solving the kinematics of start-end
+        feed_override: float, scale of the line's cruise velocity, see
+            set_feed_override()
+        One straight line queued in the planner. Velocities are in path steps/s.
+        """
+        self.start = start
+        self.end = end
+        self.path_steps = path_steps
+        self.limits = limits
+        self.record = record
+        self.replay = replay
+        length = kinematics.cable_length(start, end)
+        self.unit = tuple((end[i] - start[i]) / length for i in range(3))
+
+        self.nominal_start, self.nominal_velocity, self.acceleration, self.jerk = limits
+        self.set_feed_override(feed_override)
+        # The S-curve needs longer to reach a velocity than the trapezoid;
+        # planning with half the acceleration keeps its ramps feasible.
+        self.plan_acceleration = self.acceleration
+        if constant.MOTION_PROFILE == PROFILE_SCURVE:
+            self.plan_acceleration = self.acceleration / 2
+
+        self.max_entry = self.start_velocity
+        self.entry = self.start_velocity
+        self.exit = self.start_velocity
+
+    def set_feed_override(self, feed_override: float):
+        """
+        Scales the cruise velocity, never the acceleration or jerk. The speed
+        a move may start from standstill at is lowered with it, but not
+        raised. Without ramps ("constant"), nothing runs above that speed.
+        """
+        if constant.MOTION_PROFILE == PROFILE_CONSTANT:
+            self.start_velocity = self.nominal_start * min(feed_override, 1.0)
+            self.max_velocity = self.start_velocity
+        else:
+            self.max_velocity = self.nominal_velocity * feed_override
+            self.start_velocity = min(self.nominal_start, self.max_velocity)
+
+    def reachable(self, velocity: float):
+        """
+        Highest velocity reachable over the block from `velocity` (or,
+        reversed, the highest velocity from which `velocity` is reachable).
+        """
+        return math.sqrt(velocity * velocity + 2.0 * self.plan_acceleration * self.path_steps)
+
+    def slowest(self, velocity: float):
+        """
+        Lowest velocity the block can slow down to from `velocity`.
+        """
+        return math.sqrt(max(velocity * velocity - 2.0 * self.plan_acceleration * self.path_steps, 0.0))
+
+    def profile(self):
+        """
+        Returns the MotionProfile of the block from its planned entry velocity
+        to its planned exit velocity.
+        """
+        return MotionProfile(
+            constant.MOTION_PROFILE,
+            start_velocity=self.entry,
+            max_velocity=self.max_velocity,
+            acceleration=self.acceleration,
+            jerk=self.jerk,
+            end_velocity=self.exit
+        )
+
+
+class Planner:
+
+    def __init__(self, controller, queue_size: int=constant.PLANNER_QUEUE_SIZE, tolerance: float=None):
+        """
+        params:
+        controller: Controller, executes the planned lines
+        queue_size: int, number of blocks looked ahead over
+        tolerance: float, line tolerance in cm, defaults to constant.LINE_TOLERANCE
+        Look-ahead motion planner in the style of GRBL. Straight lines are
+        queued as blocks; every time the queue changes, a backward and a
+        forward pass set each block's entry and exit velocity so that consecutive
+        lines blend at the fastest junction speed the corner allows while the
+        last queued block can still stop. The oldest block runs once the queue
+        is full, and flush() runs the rest down to standstill, so a sequence of
+        jogs executes as one continuous motion.
+        """
+        self.controller = controller
+        self.queue_size = queue_size
+        self.tolerance = tolerance
+        self.blocks = []
+        self.position = None    # end of the queued path
+        self.exit_velocity = None  # exit velocity of the last block taken to run
+        self.chain = False      # a stream is in progress on the step scheduler
+        self.feed_override = 1.0
+
+    def queued_position(self):
+        """
+        Returns where the end effector will be once every queued block has run.
+        """
+        return self.position if self.position is not None else self.controller.current_position
+
+    def add(self, target, record=None):
+        """
+        params:
+        target: (x, y, z), end of the next straight line
+        record: StepRecord, records the steps the line issues
+        Queues a straight line from the end of the queued path to `target`,
+        running the oldest block once the queue is over full.
+        """
+        self.queue(target, record)
+        self.run_overflow()
+
+    def add_replay(self, record, line: int):
+        """
+        Queues a recorded line to run backwards (see queue_replay), running
+        the oldest block once the queue is over full.
+        """
+        self.queue_replay(record, line)
+        self.run_overflow()
+
+    def run_overflow(self):
+        if len(self.blocks) > self.queue_size:
+            self.execute(self.next_block())
+
+    def queue(self, target, record=None):
+        """
+        Queues a straight line from the end of the queued path to `target`
+        without running anything.
+        """
+        start = self.queued_position()
+        if start == target:
+            return
+        self.queue_block(Block(
+            start, target,
+            self.controller.line_path_steps(start, target),
+            self.controller.line_limits(start, target, self.tolerance),
+            record, feed_override=self.feed_override
+        ))
+
+    def queue_replay(self, record, line: int):
+        """
+        params:
+        record: StepRecord, steps a command issued
+        line: int, index of the recorded line to undo
+        Queues a recorded line to run backwards, from where it ended to where
+        it started, with its recorded steps inverted. The line's recorded
+        limits plan it like any other, so undo blends and ramps the same way.
+        """
+        start, end, limits, _ = record.lines[line]
+        if start == end:
+            return
+        first, last = record.line_range(line)
+        path_steps = max(1, round(sum(record.spans[first:last])))
+        self.queue_block(Block(end, start, path_steps, limits, replay=(record, line),
+                               feed_override=self.feed_override))
+
+    def queue_block(self, block: Block):
+        if self.blocks:
+            block.max_entry = self.junction_velocity(self.blocks[-1], block)
+        self.blocks.append(block)
+        self.position = block.end
+
+    def set_feed_override(self, feed_override: float):
+        """
+        params:
+        feed_override: float, fraction of the programmed cruise velocity,
+            clamped to FEED_OVERRIDE_MIN..FEED_OVERRIDE_MAX
+        Rescales every queued block and their junctions; they are replanned
+        when the next block is taken. Returns the override set.
+        """
+        feed_override = min(max(feed_override, constant.FEED_OVERRIDE_MIN), constant.FEED_OVERRIDE_MAX)
+        self.feed_override = feed_override
+        previous = None
+        for block in self.blocks:
+            block.set_feed_override(feed_override)
+            if previous is not None:
+                block.max_entry = self.junction_velocity(previous, block)
+            previous = block
+        return feed_override
+
+    def requeue_rest(self, block: Block, point, velocity: float):
+        """
+        params:
+        block: Block, a line (not a replay) being cut into segments
+        point: (x, y, z), where the segments cut from it so far end
+        velocity: float, path steps/s the line reaches at `point`
+        Puts the rest of the line back at the head of the queue, to be
+        replanned (e.g. under a new feed override) from `velocity` on.
+        """
+        rest = Block(point, block.end, self.controller.line_path_steps(point, block.end),
+                     self.controller.line_limits(point, block.end, self.tolerance),
+                     block.record, feed_override=self.feed_override)
+        if self.blocks:
+            self.blocks[0].max_entry = self.junction_velocity(rest, self.blocks[0])
+        self.blocks.insert(0, rest)
+        self.exit_velocity = velocity
+
+    def segments(self, block: Block):
+        """
+        Returns the generator that loads the segments of a block into the
+        controller's move, see Controller.line_segments. The block keeps the
+        master profile it runs on.
+        """
+        block.master = block.profile()
+        if block.replay is not None:
+            record, line = block.replay
+            return self.controller.replay_segments(record, line, block.master, block.path_steps)
+        return self.controller.line_segments(
+            block.start, block.end, block.master, block.path_steps, self.tolerance)
+
+    def next_block(self):
+        """
+        Replans the queue and takes its oldest block for execution, which
+        fixes its exit velocity. The plan always ends at a stop, so the block
+        is safe to run whatever is queued after it later.
+        """
+        self.recalculate()
+        block = self.blocks.pop(0)
+        self.exit_velocity = block.exit
+        return block
+
+    def flush(self):
+        """
+        Runs every queued block and brings the motion to a stop.
+        """
+        while self.blocks:
+            self.execute(self.next_block())
+        self.stop()
+
+    def stop(self):
+        """
+        Ends the stream once the queue has run dry: waits for the last step
+        period and forgets the velocity the machine was moving at.
+        """
+        if self.chain:
+            self.controller.finish_stream()
+        self.chain = False
+        self.exit_velocity = None
+        self.position = None
+
+    def clear(self):
+        """
+        Drops every queued block, e.g. on abort.
+        """
+        self.blocks = []
+        self.position = None
+
+    def junction_velocity(self, previous: Block, block: Block):
+        """
+        Highest speed at which `previous` may hand over to `block`. Uses the
+        GRBL junction deviation model: the corner is treated as an arc that
+        stays within JUNCTION_DEVIATION of the sharp corner, taken at the
+        acceleration limit. Never below the speed both lines can start from.
+        """
+        cos_theta = -sum(previous.unit[i] * block.unit[i] for i in range(3))
+        floor = min(previous.start_velocity, block.start_velocity)
+        if cos_theta > 0.999999:
+            # Full reversal
+            return floor
+        ceiling = min(previous.max_velocity, block.max_velocity)
+        if cos_theta < -0.999999:
+            # Straight on
+            return ceiling
+
+        sin_half = math.sqrt(0.5 * (1.0 - cos_theta))
+        deviation = constant.JUNCTION_DEVIATION * constant.STEPS_PER_CM
+        acceleration = min(previous.plan_acceleration, block.plan_acceleration)
+        velocity = math.sqrt(acceleration * deviation * sin_half / (1.0 - sin_half))
+        return min(max(velocity, floor), ceiling)
+
+    def recalculate(self):
+        """
+        Backward pass from a stop at the end of the queue, then forward pass
+        from the exit velocity of the last block taken to run.
+        """
+        blocks = self.blocks
+        exit_velocity = blocks[-1].start_velocity
+        for block in reversed(blocks):
+            block.exit = exit_velocity
+            block.entry = min(block.max_entry, block.reachable(exit_velocity))
+            exit_velocity = block.entry
+
+        # Each block enters at the speed the previous one leaves at. After the
+        # feed override was lowered that can be above the backward plan, and
+        # the block then slows down as fast as it may.
+        entry_velocity = blocks[0].entry
+        if self.exit_velocity is not None:
+            entry_velocity = self.exit_velocity
+        for block in blocks:
+            block.entry = entry_velocity
+            block.exit = max(min(block.exit, block.reachable(block.entry)), block.slowest(block.entry))
+            entry_velocity = block.exit
+
+    def execute(self, block: Block):
+        """
+        Streams one planned block, recording its steps if it has a record.
+        """
+        if block.replay is not None:
+            self.chain = self.controller.stream_segments(self.segments(block), chain=self.chain)
+        else:
+            if block.record is not None:
+                block.record.begin_line(block.start, block.limits)
+            self.chain = self.controller.stream_line(
+                block.start, block.end, block.profile(), block.path_steps, self.tolerance,
+                chain=self.chain, record=block.record)
+        self.controller.update_current_position(block.end)
@@ -0,0 +1,107 @@
+import backend
+from timing import NS_PER_S
+
+
+class MotionStats:
+
+    def __init__(self):
+        """
+        Counters of where the time goes on the device, kept since the last
+        reset(): planned against actual motion time and the edges that missed
+        their deadlines (accumulated from the EdgeTimer as each motion ends),
+        the worst control tick overrun of the runtime, IK time, garbage
+        collections and the lowest free heap seen while moving, and commands
+        per second. Updating them is a few additions; nothing is formatted
+        until report().
+        """
+        self.reset()
+
+    def reset(self):
+        self.clock = backend.active
+        self.since_ns = self.clock.monotonic_ns()
+        self.commands = 0
+        self.motions = 0
+        self.planned_ns = 0
+        self.actual_ns = 0
+        self.edges = 0
+        self.missed_edges = 0
+        self.worst_edge_ns = 0
+        self.ticks = 0
+        self.tick_overruns = 0
+        self.worst_tick_ns = 0
+        self.ik_calls = 0
+        self.ik_ns = 0
+        self.gc_collections = 0
+        self.min_mem_free = None
+        self.last_mem_free = None
+        self.last_collections = self.clock.gc_collections()
+
+    def end_motion(self, timer):
+        """
+        params:
+        timer: EdgeTimer, at the end of a move or stream
+        Adds the motion that just ended. The plan is the schedule the timer
+        kept, without the time it gave up resynchronising after falling
+        behind; the actual time runs to now.
+        """
+        elapsed_ns = timer.deadline_ns - timer.origin_ns
+        self.motions += 1
+        self.planned_ns += elapsed_ns - timer.skipped_ns
+        self.actual_ns += max(elapsed_ns, self.clock.monotonic_ns() - timer.origin_ns)
+        self.edges += timer.edges
+        self.missed_edges += timer.overruns
+        if timer.max_overrun_ns > self.worst_edge_ns:
+            self.worst_edge_ns = timer.max_overrun_ns
+        self.sample_heap()
+
+    def tick(self, period_ns: int, tick_ns: int):
+        """
+        params:
+        period_ns: int, time the executor yielded to the other tasks for
+        tick_ns: int, the control tick they should stay within
+        """
+        self.ticks += 1
+        if period_ns > tick_ns:
+            self.tick_overruns += 1
+            if period_ns - tick_ns > self.worst_tick_ns:
+                self.worst_tick_ns = period_ns - tick_ns
+
+    def sample_heap(self):
+        """
+        Call while moving. Where the backend cannot count collections, one is
+        assumed each time the free heap has gone up since the last sample.
+        """
+        mem_free = self.clock.mem_free()
+        if mem_free is not None:
+            if self.min_mem_free is None or mem_free < self.min_mem_free:
+                self.min_mem_free = mem_free
+            if self.last_mem_free is not None and mem_free > self.last_mem_free:
+                self.gc_collections += 1
+            self.last_mem_free = mem_free
+        collections = self.clock.gc_collections()
+        if collections is not None:
+            self.gc_collections += collections - self.last_collections
+            self.last_collections = collections
+
+    def report(self):
+        """
+        Returns the counters as lines of text.
+        """
+        elapsed = (self.clock.monotonic_ns() - self.since_ns) / NS_PER_S
+        rate = self.commands / elapsed if elapsed > 0 else 0.0
+        lines = [
+            f"Commands: {self.commands} in {elapsed:.1f} s ({rate:.2f}/s)",
+            f"Motion: {self.motions} moves, planned {self.planned_ns / NS_PER_S:.3f} s, "
+            f"actual {self.actual_ns / NS_PER_S:.3f} s",
+            f"Edges: {self.edges}, {self.missed_edges} missed their deadline "
+            f"(worst {self.worst_edge_ns // 1000} us)",
+            f"Control ticks: {self.ticks}, {self.tick_overruns} overran "
+            f"(worst {self.worst_tick_ns // 1000} us)",
+            f"IK: {self.ik_calls} poses in {self.ik_ns / 1_000_000:.1f} ms",
+            f"GC: {self.gc_collections} collections while moving, lowest free heap "
+            f"{'n/a' if self.min_mem_free is None else self.min_mem_free} bytes",
+        ]
+        return lines
+
+
+stats = MotionStats()
@@ -0,0 +1,625 @@
+import asyncio
+import math
+import struct
+
+import backend
+import constant
+import kinematics
+import console_log
+from console_log import log
+from profiling import stats
+import serial_protocol as protocol
+from segment_buffer import SegmentBuffer
+from timing import NS_PER_S
+from velocity_jog import VelocityJog
+
+
+class Runtime:
+
+    def __init__(self, processor, tick: float=constant.CONTROL_TICK):
+        """
+        params:
+        processor: CommandProcessor, validates, compiles and logs commands
+        tick: float, control tick in seconds
+        Cooperative runtime built from three asyncio tasks sharing one loop:
+        serial_task reads input and queues commands, plan_task compiles them
+        into the look-ahead planner and turns the planned lines into
+        ready-to-run segments in a SegmentBuffer, and execute_task drains the
+        buffer. stream_task takes host-planned segments from the binary data
+        port (see serial_protocol) straight into the same buffer. In velocity
+        jog mode plan_task plans the motion from the keys held instead (see
+        VelocityJog). The executor steps one control tick at a time and yields
+        in between, so input is read, new commands are planned and the next
+        segments are solved while the robot moves, and an abort starts a
+        controlled stop within one tick.
+        """
+        self.processor = processor
+        self.controller = processor.controller
+        self.planner = processor.planner
+        self.tick = tick
+        self.tick_ns = int(tick * NS_PER_S)
+
+        self.line = ""          # serial input up to the next newline
+        self.commands = []      # command lines waiting to be planned
+        self.waypoints = []     # compiled line ends (or recorded lines to undo) waiting for room in the planner
+        self.record = None      # StepRecord of the command being planned
+        self.replay = False     # ... and whether it is being undone
+        self.abort_requested = False
+        self.closed = False     # end of input (simulator only)
+
+        self.buffer = SegmentBuffer(constant.SEGMENT_BUFFER_SIZE, self.controller.move.motor_count)
+        self.block = None       # block being cut into segments
+        self.segments = None    # its line_segments() generator
+        self.segment_start = None
+        self.stopping = None    # StoppingProfile of an abort under way
+        self.recorded_block = None  # block whose line the executor is recording
+
+        self.decoder = protocol.FrameDecoder()
+        self.stream_open = False    # a HELLO was acknowledged and no abort since
+        self.expected_seq = 0       # sequence number of the next frame
+        self.credits = 0            # credits the host holds
+        self.returned = 0           # credits of segments run, not yet granted back
+        self.streamed = False       # streamed segments are queued or have run since the last rest
+
+        self.jog = VelocityJog()
+        self.jog_saved = None       # jog state and planned_counts before the newest jog segment
+        self.repeats_until = None   # direction keys before this time (ns) are repeats from the jog
+
+    async def run(self):
+        """
+        Runs the three tasks until the input is closed and everything queued
+        has been executed. On the board the input never closes.
+        """
+        await asyncio.gather(self.serial_task(), self.plan_task(), self.execute_task(),
+                             self.stream_task())
+        if self.jog.active:
+            self.end_jog()
+        log.drain()
+
+    def idle(self):
+        return not (self.commands or self.waypoints or self.planner.blocks
+                    or self.segments or self.buffer.occupancy or self.jog.moving())
+
+    async def pause(self):
+        """
+        Yields to the other tasks. While moving (or about to) the executor
+        yields once per control tick, so the other tasks just take their turn;
+        at rest they sleep for a tick, after the console log is printed.
+        """
+        if self.planner.chain or not self.idle():
+            await asyncio.sleep(0)
+        else:
+            log.drain()
+            await asyncio.sleep(self.tick)
+
+    async def serial_task(self):
+        """
+        Collects input into lines and queues each line as a command. The
+        abort character acts as soon as it arrives, even mid-line, and so do
+        the keys of the velocity jog.
+        """
+        while True:
+            text = backend.active.read_input()
+            if text is None:
+                self.closed = True
+                return
+            for char in text:
+                if char == constant.ABORT_CHAR:
+                    self.abort()
+                elif self.jog.active:
+                    self.jog_key(char)
+                elif self.jog_repeat(char):
+                    continue
+                elif char in "\r\n":
+                    self.accept(self.line.strip().lower())
+                    self.line = ""
+                else:
+                    self.line += char
+            await self.pause()
+
+    def accept(self, command):
+        """
+        Queues one complete input line for planning.
+        """
+        if not command:
+            return
+        if command.startswith("log "):
+            self.set_log_level(command[4:].strip())
+            return
+        if command.startswith("feed"):
+            self.set_feed_override(command[4:].strip())
+            return
+        if command == "stats":
+            self.show_stats()
+            return
+        if command == constant.JOG_MODE_CHAR:
+            self.start_jog()
+            return
+        if command == "reset":
+            stats.reset()
+            self.controller.ik_estimated = self.controller.ik_solved = 0
+            log.info("Statistics reset.")
+            return
+        if command != 'r' and not self.processor.is_valid_sequence(command):
+            log.warning("Invalid command sequence.")
+            return
+        log.info("Processing command: %s", command)
+        stats.commands += 1
+        self.commands.append(command)
+
+    def set_log_level(self, name):
+        """
+        Selects the console log level by name ("debug" adds per-motor output).
+        """
+        level = console_log.LEVEL_NAMES.get(name)
+        if level is None:
+            log.warning("Log levels: %s", ", ".join(console_log.LEVEL_NAMES))
+            return
+        log.set_level(level)
+        log.info("Log level: %s", name)
+
+    def set_feed_override(self, text):
+        """
+        params:
+        text: str, percentage of the programmed speed, or "" to show it
+        Rescales the queued moves and the rest of the line being run without
+        stopping. The segments already in the buffer keep their timing.
+        """
+        if text:
+            try:
+                percent = float(text.rstrip("%"))
+            except ValueError:
+                percent = math.nan
+            if not math.isfinite(percent):
+                log.warning("Feed override is a percentage, e.g. feed 150")
+                return
+            self.planner.set_feed_override(percent / 100.0)
+            self.retime_block()
+        log.info("Feed override: %d%%", round(self.planner.feed_override * 100))
+
+    def retime_block(self):
+        """
+        Hands the part of the current line not yet cut into segments back to
+        the planner, entering at the velocity the line has reached there, so
+        it is replanned at the new feed override. Replayed (undo) lines run on
+        at the speed they started with.
+        """
+        block = self.block
+        if self.segments is None or block.replay is not None or self.abort_requested:
+            return
+        point = self.segment_start
+        if point == block.end:
+            return
+        done = kinematics.cable_length(block.start, point) / kinematics.cable_length(block.start, block.end)
+        step = min(int(done * block.path_steps), block.path_steps - 1)
+        velocity = 1.0 / block.master.step_period(step, block.path_steps)
+        self.planner.requeue_rest(block, point, velocity)
+        self.segments = None
+
+    def start_jog(self):
+        """
+        Enters velocity jog mode, from rest only.
+        """
+        if not self.idle() or self.planner.chain or self.streamed:
+            log.warning("Velocity jog starts from rest.")
+            return
+        stats.commands += 1
+        self.processor.logger.log_command(constant.JOG_MODE_CHAR)
+        self.processor.logger.drop_records()
+        self.jog.start(self.controller.current_position)
+        backend.active.key_input(True)
+        log.info("Velocity jog: hold w/s/a/d/u/n to move, %s to end, %s to abort.",
+                 constant.JOG_MODE_CHAR, constant.ABORT_CHAR)
+
+    def jog_key(self, char):
+        """
+        Acts on one key of the velocity jog. When it changes the target
+        velocity, the segment queued behind the running one is taken back and
+        planned again, so the key acts within one control period.
+        """
+        if char == constant.JOG_MODE_CHAR:
+            self.jog.leave()
+        elif char in self.processor.command_modes and not self.jog.leaving:
+            if not self.jog.press(self.processor.command_modes[char], backend.active.monotonic_ns()):
+                return
+        else:
+            return
+        if self.buffer.occupancy > 1 and not self.abort_requested:
+            self.buffer.retract()
+            state, counts = self.jog_saved
+            self.jog.restore(state)
+            self.controller.planned_counts[:] = counts
+
+    def end_jog(self):
+        self.jog.active = False
+        self.line = ""
+        self.repeats_until = backend.active.monotonic_ns() + int(constant.JOG_HOLD * NS_PER_S)
+        backend.active.key_input(False)
+        log.info("Velocity jog ended.")
+
+    def jog_repeat(self, char):
+        """
+        Tells whether `char` repeats a direction key still held when the
+        velocity jog ended, so it is dropped instead of typed. Repeats keep
+        coming within JOG_HOLD of each other; a gap or any other key ends them.
+        """
+        if self.repeats_until is None:
+            return False
+        now_ns = backend.active.monotonic_ns()
+        if char not in self.processor.command_modes or now_ns > self.repeats_until:
+            self.repeats_until = None
+            return False
+        self.repeats_until = now_ns + int(constant.JOG_HOLD * NS_PER_S)
+        return True
+
+    def show_stats(self):
+        """
+        Logs the profiling counters (see profiling.py), printed at rest.
+        """
+        for line in stats.report():
+            log.info("%s", line)
+        controller = self.controller
+        log.info("IK: %d poses estimated, %d solved exactly",
+                 controller.ik_estimated, controller.ik_solved)
+        log.info("Segment buffer: %s", self.buffer.report())
+
+    def abort(self):
+        """
+        Drops every command not yet planned, and the line being typed;
+        execute_task ramps the motion down to a stop and drops the planned
+        lines.
+        """
+        log.info("Abort requested")
+        self.abort_requested = True
+        self.commands = []
+        self.line = ""
+        self.stream_open = False
+        if self.jog.active:
+            self.jog.leave()
+
+    async def plan_task(self):
+        """
+        Compiles queued commands, feeds the compiled lines to the planner as
+        it makes room for them, and keeps the segment buffer topped up.
+        """
+        while not (self.closed and self.idle()):
+            if not (self.abort_requested or self.streamed):
+                self.plan()
+            self.produce()
+            await self.pause()
+
+    def plan(self):
+        while self.commands and not self.waypoints:
+            command = self.commands[0]
+            if command == 'r':
+                # Undo replays the steps the last command recorded, so that
+                # command has to have finished running first
+                if self.planner.blocks or self.segments or self.buffer.occupancy:
+                    return
+                self.commands.pop(0)
+                command, self.record = self.processor.pop_last_record()
+                if self.record is None:
+                    log.info("No command to reverse.")
+                    continue
+                log.info("Reversing sequence: %s", command)
+                self.replay = True
+                self.waypoints = list(range(len(self.record.lines) - 1, -1, -1))
+            else:
+                self.commands.pop(0)
+                waypoints = self.processor.compile_sequence(command)
+                if not waypoints:
+                    continue
+                self.record = self.processor.new_record()
+                self.processor.logger.log_command(command, self.record)
+                self.replay = False
+                self.waypoints = waypoints
+
+        # Everything that fits goes in at once, so the executor looks ahead
+        # over the whole command
+        while self.waypoints and len(self.planner.blocks) < self.planner.queue_size:
+            if self.replay:
+                self.planner.queue_replay(self.record, self.waypoints.pop(0))
+            else:
+                self.planner.queue(self.waypoints.pop(0), self.record)
+
+    def produce(self):
+        """
+        Solves segments of the planned path into the segment buffer until it
+        is full or holds SEGMENT_LEAD of motion (besides the segment running),
+        so a feed override soon reaches the line being run. Once the buffer is
+        full, each turn only replaces the segments the executor has used up
+        since the last one. During an abort it keeps going, so the stop ramp
+        has segments to run on.
+        """
+        if self.jog.active:
+            self.produce_jog()
+            return
+        controller = self.controller
+        buffer = self.buffer
+        while not buffer.full() and (buffer.occupancy < 2 or buffer.lead < constant.SEGMENT_LEAD):
+            if self.segments is None:
+                if not self.planner.blocks:
+                    return
+                block = self.block = self.planner.next_block()
+                self.segment_start = block.start
+                self.segments = self.planner.segments(block)
+
+            point = next(self.segments)
+            segment = buffer.reserve()
+            segment.move.copy_from(controller.move)
+            segment.profiles[:] = controller.profiles
+            segment.start = self.segment_start
+            segment.end = point
+            segment.block = self.block
+            segment.stop_velocity = self.block.start_velocity
+            duration = 0.0
+            for i, profile in enumerate(segment.profiles):
+                if profile is not None:
+                    duration = profile.duration(segment.move.steps[i])
+                    break
+            buffer.commit(duration)
+            self.segment_start = point
+            if point is self.block.end:
+                self.segments = None
+
+    def produce_jog(self):
+        """
+        Plans the velocity jog one control period at a time into segments
+        that step at a constant rate, keeping one segment queued behind the
+        one running (see jog_key). Periods without a step to take are merged
+        into the next segment.
+        """
+        controller = self.controller
+        jog = self.jog
+        speed = constant.JOG_VELOCITY * self.planner.feed_override
+        while self.buffer.occupancy < 2:
+            self.jog_saved = (jog.state(), controller.planned_counts[:])
+            start = jog.position
+            counts = None
+            while counts is None:
+                point = jog.advance(backend.active.monotonic_ns(), speed)
+                if point is None:
+                    if jog.leaving:
+                        self.end_jog()
+                    return
+                targets = controller.solve_targets(point)
+                counts = [targets[i] - controller.planned_counts[i] for i in range(len(targets))]
+                if not any(counts):
+                    counts = None
+
+            master = 0
+            for i in range(len(counts)):
+                if abs(counts[i]) > abs(counts[master]):
+                    master = i
+            duration_us = jog.cut(controller.next_step_time(master, jog.velocity))
+            segment = self.buffer.reserve()
+            segment.stop_velocity = controller.streamed_segment(segment.move, segment.profiles,
+                                                                duration_us, counts)
+            segment.start = start
+            segment.end = point
+            segment.block = None
+            self.buffer.commit()
+
+    async def execute_task(self):
+        """
+        Runs buffered segments as they arrive, and stops the stream once
+        nothing more is planned.
+        """
+        while not (self.closed and self.idle()):
+            segment = self.buffer.peek()
+            if segment is not None:
+                self.buffer.taken()
+                await self.execute_segment(segment)
+            elif self.abort_requested:
+                self.stop_after_abort(self.controller.current_position)
+            elif self.planner.chain and (self.segments or self.planner.blocks or self.jog.moving()):
+                # Moving, with more of the path still to be solved
+                self.buffer.underruns += 1
+                await asyncio.sleep(0)
+            else:
+                self.rest()
+                await asyncio.sleep(self.tick)
+        self.rest()
+
+    def rest(self):
+        """
+        Ends the stream once the planner has run dry.
+        """
+        if self.streamed:
+            self.end_stream()
+        if self.planner.chain:
+            self.planner.stop()
+            self.processor.logger.seal()
+            log.info("Current position: %s\n", self.controller.current_position)
+            self.controller.log_motors()
+            if self.buffer.underruns:
+                log.warning("Planning underrun: %s", self.buffer.report())
+
+    async def execute_segment(self, segment):
+        """
+        Runs one buffered segment a control tick at a time. On abort, the
+        motion ramps down to a stop, on through the following segments if
+        need be, and the position is taken from the steps the motors
+        actually took.
+        """
+        controller = self.controller
+        scheduler = controller.scheduler
+        planner = self.planner
+        if not planner.chain:
+            # A new stream: buffer statistics cover one stream each
+            self.buffer.reset_stats()
+        record = None
+        if segment.block is not None:
+            record = segment.block.record
+        if record is not None and segment.block is not self.recorded_block:
+            record.begin_line(segment.block.start, segment.block.limits)
+            self.recorded_block = segment.block
+        scheduler.begin(segment.move, segment.profiles, chain=planner.chain)
+        planner.chain = True
+        busy = True
+        monotonic_ns = controller.timer.monotonic_ns
+        while busy:
+            if self.abort_requested:
+                self.stopping = scheduler.stop(segment.stop_velocity, self.stopping)
+            busy = scheduler.advance(self.tick_ns)
+            # Every other task takes its turn; longer than a tick delays edges
+            yielded_ns = monotonic_ns()
+            await asyncio.sleep(0)
+            stats.tick(monotonic_ns() - yielded_ns, self.tick_ns)
+        stats.sample_heap()
+
+        if scheduler.stop_reached:
+            counts = [scheduler.completed(i) for i in range(segment.move.motor_count)]
+            controller.count_steps(controller.step_counts, segment.move, counts)
+            position = controller.position_from_steps(
+                controller.current_position if segment.start is None else segment.start)
+            if record is not None:
+                record.add_segment(segment.move, segment.profiles, position, counts)
+            self.stop_after_abort(position)
+        else:
+            controller.count_steps(controller.step_counts, segment.move)
+            if log.verbose:
+                move = segment.move
+                log.debug("Segment steps (+ for a high DIR level): %s",
+                          [move.steps[i] if move.direction[i] else -move.steps[i]
+                           for i in range(move.motor_count)])
+            if record is not None:
+                record.add_segment(segment.move, segment.profiles, segment.end)
+            if segment.end is not None:
+                controller.update_current_position(segment.end)
+            else:
+                self.returned += 1
+            self.buffer.pop()
+
+    def stop_after_abort(self, position):
+        """
+        Drops everything planned and brings the stream to rest at `position`.
+        """
+        self.controller.update_current_position(position)
+        self.controller.reset_plan()
+        if self.streamed:
+            self.end_stream()
+        self.waypoints = []
+        self.planner.clear()
+        self.buffer.clear()
+        self.segments = None
+        self.stopping = None
+        self.planner.stop()
+        self.processor.logger.seal()
+        self.abort_requested = False
+        if self.jog.active:
+            self.end_jog()
+        log.info("Aborted at: %s\n", self.controller.current_position)
+        self.controller.log_motors()
+
+    async def stream_task(self):
+        """
+        Receives frames on the binary data port and loads the segments they
+        carry straight into the segment buffer, granting the host a credit
+        back for every segment run. Ends at once on a board without the port.
+        """
+        while not (self.closed and self.idle()):
+            data = backend.active.read_data()
+            if data is None:
+                return
+            if data:
+                for frame_type, seq, payload in self.decoder.feed(data):
+                    self.receive_frame(frame_type, seq, payload)
+            self.grant_credits()
+            await self.pause()
+
+    def receive_frame(self, frame_type, seq, payload):
+        """
+        Handles one decoded frame and answers it with ACK or NAK. ABORT acts
+        whatever its sequence number and takes none; a repeat of the last
+        frame (its ACK was lost) is acknowledged again but not run twice.
+        """
+        if frame_type is None:
+            self.nak(protocol.NAK_CRC)
+        elif frame_type == protocol.FRAME_ABORT:
+            self.abort()
+            self.ack(seq, 0)
+        elif frame_type == protocol.FRAME_HELLO:
+            if self.commands or self.waypoints or self.planner.blocks or self.segments or self.jog.active:
+                self.nak(protocol.NAK_BUSY)
+                return
+            self.stream_open = True
+            self.expected_seq = (seq + 1) & 0xFFFF
+            self.credits = self.buffer.capacity - self.buffer.occupancy
+            self.returned = 0
+            self.ack(seq, self.credits)
+        elif seq == (self.expected_seq - 1) & 0xFFFF:
+            self.ack(seq, 0)
+        elif seq != self.expected_seq:
+            self.nak(protocol.NAK_SEQUENCE)
+        elif not self.stream_open:
+            self.nak(protocol.NAK_CLOSED)
+        elif frame_type != protocol.FRAME_SEGMENTS:
+            self.nak(protocol.NAK_MALFORMED)
+        else:
+            count = protocol.segment_count(payload, self.controller.move.motor_count)
+            if count is None:
+                self.nak(protocol.NAK_MALFORMED)
+            elif count > self.credits:
+                self.nak(protocol.NAK_CREDIT)
+            elif self.commands or self.waypoints or self.planner.blocks or self.segments or self.jog.active:
+                self.nak(protocol.NAK_BUSY)
+            else:
+                self.load_segments(payload, count)
+                self.expected_seq = (seq + 1) & 0xFFFF
+                self.ack(seq, 0)
+
+    def load_segments(self, payload, count: int):
+        """
+        Copies the segments of a FRAME_SEGMENTS payload into the buffer. The
+        credits the host spent guarantee there is room for them. The commands
+        run before can no longer be undone once a stream has moved the robot.
+        """
+        controller = self.controller
+        self.processor.logger.drop_records()
+        layout = protocol.segment_format(controller.move.motor_count)
+        size = struct.calcsize(layout)
+        self.credits -= count
+        for k in range(count):
+            values = struct.unpack_from(layout, payload, 1 + k * size)
+            segment = self.buffer.reserve()
+            stop_velocity = controller.streamed_segment(segment.move, segment.profiles, values[0], values[1:])
+            if stop_velocity is None:
+                # Nothing to step: the slot was never used
+                self.returned += 1
+                continue
+            segment.start = segment.end = segment.block = None
+            segment.stop_velocity = stop_velocity
+            self.buffer.commit()
+            self.streamed = True
+
+    def grant_credits(self):
+        """
+        Grants back the credits of segments run, a few at a time while moving
+        and all at once when the buffer has drained.
+        """
+        if self.returned and self.stream_open and (
+                self.returned >= constant.STREAM_CREDIT_BATCH or not self.buffer.occupancy):
+            self.credits += self.returned
+            self.send(protocol.FRAME_CREDIT, 0, struct.pack("<H", self.returned))
+            self.returned = 0
+
+    def end_stream(self):
+        """
+        Takes the position from the steps the streamed segments took, which
+        carry no end points, and reports the step counts to the host.
+        """
+        controller = self.controller
+        controller.update_current_position(controller.position_from_steps(controller.current_position))
+        self.send(protocol.FRAME_STATUS, self.expected_seq, struct.pack("<" + "l" * len(controller.step_counts),
+                                                        *controller.step_counts))
+        self.streamed = False
+
+    def ack(self, seq: int, credits: int):
+        self.send(protocol.FRAME_ACK, seq, struct.pack("<H", credits))
+
+    def nak(self, reason: int):
+        self.send(protocol.FRAME_NAK, self.expected_seq, struct.pack("<B", reason))
+
+    def send(self, frame_type: int, seq: int, payload=b""):
+        backend.active.write_data(protocol.encode_frame(frame_type, seq, payload))
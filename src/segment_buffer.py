@@ -0,0 +1,108 @@
+from move import Move
+
+
+class Segment:
+
+    def __init__(self, motor_count: int):
+        """
+        params:
+        motor_count: int, number of motors
+        One ready-to-run stretch of a planned line: the steps and profiles
+        the step scheduler runs, where it starts and ends, the planner block
+        it belongs to and the velocity it can stop dead from. Segments
+        streamed by the host have no block and no known end points.
+        """
+        self.move = Move(motor_count)
+        self.profiles = [None] * motor_count
+        self.start = None
+        self.end = None
+        self.block = None
+        self.stop_velocity = 0.0
+        self.duration = 0.0     # seconds it runs for, where the producer knows
+
+
+class SegmentBuffer:
+
+    def __init__(self, capacity: int, motor_count: int):
+        """
+        params:
+        capacity: int, number of segments the buffer holds
+        motor_count: int, number of motors
+        Bounded ring buffer of preallocated Segments between the producer,
+        which solves the kinematics and profiles of the planned lines ahead of
+        time, and the executor, which drains it. A consumer that finds it
+        empty while a line is still being produced counts an underrun: the
+        motors had to wait for planning.
+        """
+        self.capacity = capacity
+        self.slots = [Segment(motor_count) for _ in range(capacity)]
+        self.head = 0       # next slot to fill
+        self.tail = 0       # next slot to run
+        self.occupancy = 0
+        self.lead = 0.0     # seconds of motion buffered, counting the segment running
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.underruns = 0
+        self.min_occupancy = self.capacity  # lowest occupancy seen when a segment was taken
+
+    def full(self):
+        return self.occupancy == self.capacity
+
+    def reserve(self):
+        """
+        Returns the slot to fill next; commit() publishes it.
+        """
+        return self.slots[self.head]
+
+    def commit(self, duration: float=0.0):
+        """
+        Publishes the reserved slot, which runs for `duration` seconds.
+        """
+        self.slots[self.head].duration = duration
+        self.lead += duration
+        self.head = (self.head + 1) % self.capacity
+        self.occupancy += 1
+
+    def retract(self):
+        """
+        Takes back the newest filled slot, e.g. to solve it again. It must
+        not have been taken to run.
+        """
+        self.head = (self.head - 1) % self.capacity
+        self.occupancy -= 1
+        self.lead -= self.slots[self.head].duration
+
+    def peek(self):
+        """
+        Returns the oldest filled slot, or None when the buffer is empty.
+        """
+        return self.slots[self.tail] if self.occupancy else None
+
+    def pop(self):
+        """
+        Releases the oldest filled slot once it has run.
+        """
+        self.lead -= self.slots[self.tail].duration
+        self.tail = (self.tail + 1) % self.capacity
+        self.occupancy -= 1
+        if not self.occupancy:
+            self.lead = 0.0
+
+    def taken(self):
+        """
+        Records the occupancy as a segment is taken to run.
+        """
+        if self.occupancy < self.min_occupancy:
+            self.min_occupancy = self.occupancy
+
+    def clear(self):
+        self.head = self.tail = self.occupancy = 0
+        self.lead = 0.0
+
+    def report(self):
+        """
+        Returns a one-line summary of the buffer since reset_stats().
+        """
+        return (f"{self.occupancy}/{self.capacity} segments buffered, "
+                f"low water {self.min_occupancy}, {self.underruns} underruns")
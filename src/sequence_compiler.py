@@ -0,0 +1,52 @@
+SEQUENCE_POLYLINE = "polyline"
+SEQUENCE_NET      = "net"
+
+
+def _parallel(a, b):
+    """
+    True when displacements a and b lie on the same line (either sense).
+    """
+    cross = (a[1] * b[2] - a[2] * b[1],
+             a[2] * b[0] - a[0] * b[2],
+             a[0] * b[1] - a[1] * b[0])
+    return max(abs(c) for c in cross) < 1e-9
+
+
+def compile_displacements(vectors, mode: str=SEQUENCE_POLYLINE):
+    """
+    params:
+    vectors: iterable of (dx, dy, dz), one displacement per jog
+    mode: str, "polyline" or "net"
+    Returns the minimal list of displacements covering the same path.
+    "polyline" adds each jog onto the previous segment when both lie on the
+    same line, so runs of one direction merge and a jog undone by the next
+    one cancels; a segment that cancels to nothing lets its neighbours merge
+    in turn. "net" sums every jog into a single displacement.
+    """
+    if mode not in (SEQUENCE_POLYLINE, SEQUENCE_NET):
+        raise ValueError(f"Unknown sequence mode: {mode}")
+
+    segments = []
+    for vector in vectors:
+        if segments and (mode == SEQUENCE_NET or _parallel(segments[-1], vector)):
+            last = segments.pop()
+            vector = (last[0] + vector[0], last[1] + vector[1], last[2] + vector[2])
+        if max(abs(v) for v in vector) > 1e-9:
+            segments.append(vector)
+    return segments
+
+
+def compile_waypoints(start, vectors, mode: str=SEQUENCE_POLYLINE):
+    """
+    params:
+    start: (x, y, z), where the sequence starts
+    vectors: iterable of (dx, dy, dz), one displacement per jog
+    mode: str, "polyline" or "net"
+    Returns the end point of every compiled segment, in order.
+    """
+    waypoints = []
+    x, y, z = start
+    for dx, dy, dz in compile_displacements(vectors, mode):
+        x, y, z = x + dx, y + dy, z + dz
+        waypoints.append((x, y, z))
+    return waypoints
@@ -0,0 +1,148 @@
+import struct
+
+#
+# Binary segment stream
+#
+# Every frame is
+#   SYNC, type (u8), sequence number (u16), payload length (u16), payload, CRC
+# little-endian, where the CRC is CRC-16/CCITT-FALSE over everything between
+# SYNC and the CRC. The host numbers its frames 0, 1, 2, ... from HELLO on;
+# the device answers each with ACK or NAK.
+#
+# Flow control is credit based: one credit is one free slot of the device's
+# segment buffer. The host starts with the credits the ACK of HELLO grants,
+# spends one per segment sent, and the device grants them back in CREDIT
+# frames as it runs the segments. A NAKed frame spends no credits.
+#
+SYNC = 0xA5
+HEADER = "<BBHH"                # SYNC, type, sequence, payload length
+HEADER_SIZE = struct.calcsize(HEADER)
+MAX_PAYLOAD = 1024
+
+# Host to device
+FRAME_HELLO = 0x01      # opens a stream; the ACK grants the initial credits
+FRAME_SEGMENTS = 0x02   # count (u8), then count segments (see segment_format)
+FRAME_ABORT = 0x03      # controlled stop, as the console's ABORT_CHAR
+
+# Device to host
+FRAME_ACK = 0x81        # sequence number of the frame; credits granted (u16)
+FRAME_NAK = 0x82        # sequence number expected next; reason (u8)
+FRAME_CREDIT = 0x83     # credits granted (u16)
+FRAME_STATUS = 0x84     # the stream came to rest after every frame before its sequence
+                        # number: signed step count of every motor (i32)
+
+# NAK reasons
+NAK_CRC = 1             # corrupted frame
+NAK_SEQUENCE = 2        # not the frame expected next
+NAK_CREDIT = 3          # more segments than credits held
+NAK_BUSY = 4            # typed commands are running
+NAK_CLOSED = 5          # no stream open (no HELLO, or aborted since)
+NAK_MALFORMED = 6       # payload does not match the frame type
+
+CRC_TABLE = []
+for _byte in range(256):
+    _crc = _byte << 8
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ 0x1021) if _crc & 0x8000 else (_crc << 1)
+    CRC_TABLE.append(_crc & 0xFFFF)
+
+
+def crc16(data, crc: int=0xFFFF):
+    """
+    CRC-16/CCITT-FALSE of `data`, continuing from `crc`.
+    """
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_frame(frame_type: int, seq: int, payload=b""):
+    """
+    Returns the bytes of one frame.
+    """
+    frame = bytearray(struct.pack(HEADER, SYNC, frame_type, seq & 0xFFFF, len(payload)))
+    frame += payload
+    frame += struct.pack("<H", crc16(memoryview(frame)[1:]))
+    return bytes(frame)
+
+
+def segment_format(motor_count: int):
+    """
+    Layout of one streamed segment: its duration in microseconds (u32), then
+    the signed step count of every motor (i16), positive for cable let out.
+    """
+    return "<I" + "h" * motor_count
+
+
+def encode_segments(segments, motor_count: int):
+    """
+    params:
+    segments: list of (duration_us, steps), steps one signed count per motor
+    Returns the payload of a FRAME_SEGMENTS frame.
+    """
+    layout = segment_format(motor_count)
+    payload = bytearray(struct.pack("<B", len(segments)))
+    for duration_us, steps in segments:
+        payload += struct.pack(layout, duration_us, *steps)
+    return bytes(payload)
+
+
+def segment_count(payload, motor_count: int):
+    """
+    Returns the number of segments in a FRAME_SEGMENTS payload, or None when
+    its length does not match.
+    """
+    if not payload:
+        return None
+    count = payload[0]
+    if len(payload) != 1 + count * struct.calcsize(segment_format(motor_count)):
+        return None
+    return count
+
+
+class FrameDecoder:
+
+    def __init__(self):
+        """
+        Reassembles frames from a byte stream that may split or join them.
+        Bytes before a SYNC are skipped, so the decoder finds the next frame
+        after line noise or a corrupted header.
+        """
+        self.data = bytearray()
+
+    def feed(self, data):
+        """
+        params:
+        data: bytes just received
+        Returns every complete frame as (type, seq, payload). A frame whose CRC
+        does not match comes back with type None so it can be NAKed.
+        """
+        self.data += data
+        frames = []
+        while True:
+            # By index: CircuitPython's bytearray has no find()
+            start = 0
+            while start < len(self.data) and self.data[start] != SYNC:
+                start += 1
+            if start == len(self.data):
+                self.data = bytearray()
+                return frames
+            if start:
+                self.data = self.data[start:]
+            if len(self.data) < HEADER_SIZE:
+                return frames
+            _, frame_type, seq, length = struct.unpack_from(HEADER, self.data)
+            if length > MAX_PAYLOAD:
+                # Not a real header: look for the next SYNC
+                self.data = self.data[1:]
+                continue
+            end = HEADER_SIZE + length + 2
+            if len(self.data) < end:
+                return frames
+            expected = struct.unpack_from("<H", self.data, end - 2)[0]
+            if crc16(memoryview(self.data)[1:end - 2]) == expected:
+                frames.append((frame_type, seq, bytes(self.data[HEADER_SIZE:end - 2])))
+                self.data = self.data[end:]
+            else:
+                frames.append((None, seq, b""))
+                self.data = self.data[1:]
@@ -0,0 +1,221 @@
+import gc
+import math
+import os
+import select
+import sys
+import termios
+import tty
+
+NAME = "sim"
+
+# The virtual clock jumps straight to any deadline, so never spin
+SPIN_THRESHOLD_NS = 0
+
+
+class SimPin:
+
+    def __init__(self, name: str):
+        """
+        params:
+        name: str, pin name, e.g. "GP15"
+        Stand-in for board.Pin.
+        """
+        self.name = name
+
+    def __str__(self):
+        return "board." + self.name
+
+    __repr__ = __str__
+
+
+class SimBoard:
+    """
+    Stand-in for the board module: exposes GP0 ... GP28 as SimPin.
+    """
+    Pin = SimPin
+
+
+for _n in range(29):
+    setattr(SimBoard, f"GP{_n}", SimPin(f"GP{_n}"))
+
+board = SimBoard
+
+
+class SimClock:
+
+    def __init__(self):
+        """
+        Virtual monotonic clock. Time only advances when the code under test
+        sleeps, reads the clock (read_cost_ns) or writes a pin (write_cost_ns),
+        so runs are deterministic and take no wall-clock time.
+        """
+        self.now_ns = 0
+        self.read_cost_ns = 0
+        self.write_cost_ns = 0
+
+    def monotonic_ns(self):
+        self.now_ns += self.read_cost_ns
+        return self.now_ns
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self.now_ns += math.ceil(seconds * 1_000_000_000)
+
+    def reset(self):
+        self.now_ns = 0
+
+
+class EdgeRecorder:
+
+    def __init__(self):
+        """
+        Records every level change of every simulated output as
+        (virtual time in ns, pin name, level).
+        """
+        self.edges = []
+        self.enabled = True
+
+    def record(self, pin_name: str, value: bool):
+        if self.enabled:
+            self.edges.append((clock.now_ns, pin_name, value))
+
+    def clear(self):
+        self.edges = []
+
+    def rising_edges(self, pin_name: str):
+        """
+        Returns the virtual times (in ns) of every rising edge on a pin.
+        """
+        return [t for t, name, value in self.edges if name == pin_name and value]
+
+
+clock = SimClock()
+recorder = EdgeRecorder()
+
+monotonic_ns = clock.monotonic_ns
+sleep = clock.sleep
+
+
+def mem_free():
+    """
+    CPython has no fixed heap to report; returns None.
+    """
+    return None
+
+
+def gc_collections():
+    """
+    Returns the number of garbage collections CPython has run.
+    """
+    return sum(generation["collections"] for generation in gc.get_stats())
+
+
+class SimOutput:
+
+    def __init__(self, pin, value: bool):
+        """
+        Stand-in for a digitalio output; every level change is recorded.
+        """
+        self.name = str(pin).split(".")[-1]
+        self._value = bool(value)
+        recorder.record(self.name, self._value)
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        clock.now_ns += clock.write_cost_ns
+        value = bool(value)
+        if value != self._value:
+            self._value = value
+            recorder.record(self.name, value)
+
+
+def digital_output(pin, value: bool):
+    """
+    Returns a recorded SimOutput for `pin`.
+    """
+    return SimOutput(pin, value)
+
+
+def port_range(start: int, length: int):
+    """
+    The simulator has no port registers; step pins are written one by one.
+    """
+    return None
+
+
+def read_input():
+    """
+    Returns the characters waiting on stdin without blocking ("" when there
+    are none), or None at end of input.
+    """
+    ready, _, _ = select.select([sys.stdin], [], [], 0)
+    if not ready:
+        return ""
+    data = os.read(sys.stdin.fileno(), 1024)
+    return data.decode() if data else None
+
+
+terminal_mode = None  # stdin's terminal settings while key_input() is on
+
+
+def key_input(enabled: bool):
+    """
+    While enabled (for the velocity jog), keys typed on a terminal are
+    delivered as they are typed, without echo, instead of a line at a time.
+    """
+    global terminal_mode
+    if not sys.stdin.isatty():
+        return
+    fd = sys.stdin.fileno()
+    if enabled and terminal_mode is None:
+        terminal_mode = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+    elif not enabled and terminal_mode is not None:
+        termios.tcsetattr(fd, termios.TCSADRAIN, terminal_mode)
+        terminal_mode = None
+
+
+class SimDataPort:
+
+    def __init__(self):
+        """
+        Stand-in for the board's USB data port: a pseudo-terminal in raw mode.
+        The host side (e.g. util/stream_client.py) opens `path`.
+        """
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        print(f"Binary stream on {self.path}")
+
+    def read(self):
+        try:
+            return os.read(self.master, 4096)
+        except BlockingIOError:
+            return b""
+
+    def write(self, data):
+        os.write(self.master, data)
+
+
+data_port = None
+
+
+def read_data():
+    """
+    Returns the bytes waiting on the simulated data port without blocking
+    (b"" when there are none). The port is opened on first use.
+    """
+    global data_port
+    if data_port is None:
+        data_port = SimDataPort()
+    return data_port.read()
+
+
+def write_data(data):
+    if data_port is not None:
+        data_port.write(data)
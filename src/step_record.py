@@ -0,0 +1,78 @@
+from array import array
+import backend
+
+
+class StepRecord:
+
+    def __init__(self, motor_count: int):
+        """
+        params:
+        motor_count: int, number of motors
+        The exact steps one command issued, segment by segment, grouped into
+        the straight lines it was planned as. Each segment keeps its signed
+        step count per motor (positive for a high DIR level), the master
+        span it covered and the position it ended at, in flat arrays.
+        Replaying the segments backwards with every sign flipped returns each
+        cable to exactly where it started, with no kinematics solved.
+        """
+        self.motor_count = motor_count
+        self.counts = array("l")   # motor_count signed counts per segment
+        self.spans = array("f")    # master steps covered per segment
+        self.points = array("f")   # x, y, z at the end of each segment
+        self.lines = []            # [start, end, limits, first segment] per line
+        self.start_ns = None       # when the first line began
+        self.end_ns = None         # when the last segment ended
+
+    def begin_line(self, start, limits):
+        """
+        params:
+        start: (x, y, z), where the line starts
+        limits: (start_velocity, max_velocity, acceleration, jerk) of the line
+        Starts recording a new line; its end follows the segments added.
+        Call it as the line starts running, so the record is timed.
+        """
+        if self.start_ns is None:
+            self.start_ns = backend.active.monotonic_ns()
+        self.lines.append([start, start, limits, len(self.spans)])
+
+    def add_segment(self, move, profiles, point, counts=None):
+        """
+        params:
+        move: Move, the segment that ran
+        profiles: list, the segment's ScaledProfile per motor
+        point: (x, y, z), where the segment ended
+        counts: list, steps each motor actually took, when the segment was
+            cut short; defaults to the whole move
+        """
+        span = 0.0
+        for i in range(self.motor_count):
+            count = move.steps[i] if counts is None else counts[i]
+            self.counts.append(count if move.direction[i] else -count)
+            if count and profiles[i] is not None:
+                span = max(span, count * profiles[i].ratio)
+        self.spans.append(span)
+        for value in point:
+            self.points.append(value)
+        self.lines[-1][1] = point
+        self.end_ns = backend.active.monotonic_ns()
+
+    def line_range(self, line: int):
+        """
+        Returns (first, last + 1) segment indices of a line.
+        """
+        first = self.lines[line][3]
+        end = self.lines[line + 1][3] if line + 1 < len(self.lines) else len(self.spans)
+        return first, end
+
+    def point(self, segment: int):
+        i = 3 * segment
+        return (self.points[i], self.points[i + 1], self.points[i + 2])
+
+    def net_steps(self):
+        """
+        Returns the signed steps each motor took over the whole command.
+        """
+        net = [0] * self.motor_count
+        for j in range(len(self.counts)):
+            net[j % self.motor_count] += self.counts[j]
+        return net
@@ -0,0 +1,254 @@
+from array import array
+
+from gpio import StepPort
+from motion_profile import ScaledProfile, StoppingProfile
+from timing import NS_PER_S
+
+
+class StepScheduler:
+
+    def __init__(self, motors, timer):
+        """
+        params:
+        motors: dict, motor name -> StepperMotor, in motor index order
+        timer: EdgeTimer, deadline timer shared by all motors
+        Event-driven step executor. The next edge of every active motor is kept
+        in a priority queue ordered by its due time, so each motor pulses at
+        its own rate while all of them share one move and one clock. Edges due
+        at the same time are written to the step pins as one port write.
+        The queue is a binary heap of motor indices held in preallocated
+        arrays, so running a move allocates nothing per tick.
+        """
+        self.motors = motors
+        self.motor_list = list(motors.values())
+        self.timer = timer
+        self.step_port = StepPort([motor_obj.step_pin for motor_obj in self.motor_list])
+
+        count = len(self.motor_list)
+        self.heap = array("b", [0] * count)        # motor indices, earliest edge first
+        self.heap_size = 0
+        self.edge_ns = array("q", [0] * count)     # next edge time per motor, ns since start
+        self.edge = array("l", [0] * count)        # next edge number per motor
+        self.half_ns = array("q", [0] * count)     # half period of the step under way per motor
+        self.end_ns = 0                            # end of the move so far, ns since its start
+        self.previous_end_ns = 0                   # end of the last completed move
+        self.move = None
+        self.profiles = None
+        self.stopping = False                      # stop() was called on the loaded move
+        self.stop_reached = False                  # ... and its ramp ends within the move
+
+    def _before(self, a: int, b: int):
+        edge_ns = self.edge_ns
+        return edge_ns[a] < edge_ns[b] or (edge_ns[a] == edge_ns[b] and a < b)
+
+    def _sift_down(self, pos: int):
+        heap = self.heap
+        size = self.heap_size
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                return
+            if child + 1 < size and self._before(heap[child + 1], heap[child]):
+                child += 1
+            if not self._before(heap[child], heap[pos]):
+                return
+            heap[pos], heap[child] = heap[child], heap[pos]
+            pos = child
+
+    def run(self, move, profiles, chain=False, finish=True):
+        """
+        params:
+        move: Move, steps and directions per motor index
+        profiles: list, per motor index the profile timing that motor's steps
+            (None for motors that do not move)
+        chain: bool, start the move exactly where the previous one ended
+            instead of now, so segments stream without a gap
+        finish: bool, wait for the last step period to elapse before returning;
+            pass False when the next segment is chained and call finish() last
+        Pulses every motor through its steps, each on its own profile.
+        """
+        self.begin(move, profiles, chain)
+        self.advance()
+        if finish:
+            self.finish()
+
+    def begin(self, move, profiles, chain=False):
+        """
+        Loads a move (see run()) without stepping it; advance() then pulses it
+        out, so a cooperative caller can step it a slice at a time.
+        """
+        self.move = move
+        self.profiles = profiles
+        heap = self.heap
+        edge_ns = self.edge_ns
+        edges = self.edge
+        steps = move.steps
+
+        # Every moving motor raises its first edge at time 0, so the heap is
+        # already ordered by index.
+        self.heap_size = 0
+        for index, motor_obj in enumerate(self.motor_list):
+            if steps[index] > 0:
+                motor_obj.dir_pin.value = bool(move.direction[index])
+                edge_ns[index] = 0
+                edges[index] = 0
+                heap[self.heap_size] = index
+                self.heap_size += 1
+
+        self.end_ns = 0
+        self.stopping = self.stop_reached = False
+        if chain:
+            self.timer.chain(self.previous_end_ns)
+        else:
+            self.timer.start()
+
+    def advance(self, budget_ns: int=None):
+        """
+        params:
+        budget_ns: int, only pulse the edges scheduled within this many ns of
+            the next pending edge; None pulses the whole move
+        Pulses the loaded move. Returns True while edges remain.
+        """
+        heap = self.heap
+        edge_ns = self.edge_ns
+        edges = self.edge
+        half_periods = self.half_ns
+        steps = self.move.steps
+        profiles = self.profiles
+
+        end_ns = self.end_ns
+        stop_ns = None
+        if budget_ns is not None and self.heap_size:
+            stop_ns = edge_ns[heap[0]] + budget_ns
+        while self.heap_size:
+            now_ns = edge_ns[heap[0]]
+            if stop_ns is not None and now_ns >= stop_ns:
+                break
+            self.timer.wait_until(now_ns)
+
+            # Collect every edge due now into one rising and one falling mask
+            rise_mask = fall_mask = 0
+            while self.heap_size and edge_ns[heap[0]] == now_ns:
+                index = heap[0]
+                edge = edges[index]
+
+                # Even edges raise the step pin, odd edges lower it. The step
+                # period is solved once, on the rising edge.
+                step = edge >> 1
+                if edge & 1:
+                    fall_mask |= 1 << index
+                    half_ns = half_periods[index]
+                else:
+                    rise_mask |= 1 << index
+                    half_ns = int(profiles[index].step_period(step, steps[index]) * NS_PER_S) >> 1
+                    half_periods[index] = half_ns
+                if edge & 1 and step + 1 == steps[index]:
+                    # Motor finished: drop it from the heap
+                    if now_ns + half_ns > end_ns:
+                        end_ns = now_ns + half_ns
+                    self.heap_size -= 1
+                    heap[0] = heap[self.heap_size]
+                else:
+                    edge_ns[index] = now_ns + half_ns
+                    edges[index] = edge + 1
+                self._sift_down(0)
+
+            if rise_mask:
+                self.step_port.write(rise_mask, True)
+            if fall_mask:
+                self.step_port.write(fall_mask, False)
+
+        self.end_ns = end_ns
+        if not self.heap_size:
+            self.previous_end_ns = end_ns
+        return self.heap_size > 0
+
+    def stop(self, stop_velocity: float=None, stopping: StoppingProfile=None):
+        """
+        params:
+        stop_velocity: float, master steps/s the move can stop dead from,
+            see StoppingProfile
+        stopping: StoppingProfile, a stop already under way in an earlier
+            move of the same stream, to carry on with; if this move follows
+            another master (the next line), the stop continues on it from
+            the velocity the previous master was left at
+        Brings the loaded (coordinated) move to a controlled stop instead of
+        running it to the end. The master profile of the move is swapped for
+        a StoppingProfile that ramps down from the master position of the
+        next pending edge, and every motor's step count is cut to the steps
+        that end before the stop position (never fewer than it has started),
+        so the axes ramp down together. advance() then pulses out the ramp and
+        completed() gives the steps each motor actually took. stop_reached
+        tells whether the ramp ends within this move; if not, pass the
+        returned StoppingProfile to stop() on the next move.
+        """
+        if self.stopping or not self.heap_size:
+            return stopping
+        self.stopping = True
+        heap = self.heap
+        edge_ns = self.edge_ns
+        edges = self.edge
+        steps = self.move.steps
+        profiles = self.profiles
+        now = edge_ns[heap[0]] / NS_PER_S
+
+        for k in range(self.heap_size):
+            index = heap[k]
+            profile = profiles[index]
+            if isinstance(profile, ScaledProfile):
+                master, master_steps = profile.master, profile.master_steps
+                offset, ratio = profile.offset, profile.ratio
+            else:
+                master, master_steps, offset, ratio = profile, steps[index], 0.0, 1.0
+
+            if stopping is None:
+                position = master.position_at(master.time_at(offset, master_steps) + now, master_steps)
+                stopping = StoppingProfile(master, master_steps, position, stop_velocity)
+            elif master is not stopping and master is not stopping.master:
+                # The stop runs on into a move planned on another master
+                velocity = stopping.velocity_at(stopping.master_steps)
+                stopping = StoppingProfile(master, master_steps, offset, stop_velocity, velocity)
+            if master is not stopping:
+                if isinstance(profile, ScaledProfile):
+                    profile.master = stopping
+                else:
+                    profiles[index] = stopping
+
+            allowed = int((stopping.stop_position - offset) / ratio + 1e-9)
+            if allowed < steps[index]:
+                self.stop_reached = True
+                started = (edges[index] + 1) >> 1
+                steps[index] = max(allowed, started)
+
+        # Drop the motors that are now done: their next edge would start a step
+        end_ns = self.end_ns
+        size = 0
+        for k in range(self.heap_size):
+            index = heap[k]
+            if edges[index] & 1 or (edges[index] >> 1) < steps[index]:
+                heap[size] = index
+                size += 1
+            elif edge_ns[index] > end_ns:
+                end_ns = edge_ns[index]
+        self.end_ns = end_ns
+        self.heap_size = size
+        for pos in range(size // 2 - 1, -1, -1):
+            self._sift_down(pos)
+        if not size:
+            self.previous_end_ns = end_ns
+        return stopping
+
+    def completed(self, index: int):
+        """
+        Returns how many steps motor `index` has taken in the loaded move.
+        """
+        for k in range(self.heap_size):
+            if self.heap[k] == index:
+                return (self.edge[index] + 1) >> 1
+        return self.move.steps[index]
+
+    def finish(self):
+        """
+        Returns once the last step period of the last move has elapsed.
+        """
+        self.timer.wait_until(self.previous_end_ns)
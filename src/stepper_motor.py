@@ -1,10 +1,12 @@
-import time
-import board
-import digitalio
+from backend import board
+from gpio import OutputPin
+from motion_profile import MotionProfile, PROFILE_CONSTANT
+from timing import EdgeTimer
 
 class StepperMotor:
 
-    def __init__(self, index: int, dir_pin: board.Pin, step_pin: board.Pin, steps_per_rev: int, initial_dir: bool=False):
+    def __init__(self, index: int, dir_pin: board.Pin, step_pin: board.Pin, steps_per_rev: int, initial_dir: bool=False,
+                 profile_shape: str=PROFILE_CONSTANT, max_velocity: float=0.0, max_acceleration: float=0.0, max_jerk: float=0.0):
         """
         params:
         index: int, index of the motor, starting from 0
@@ -12,20 +14,42 @@ class StepperMotor:
         step_pin: instance of board.Pin, steps pin
         steps_per_rev: int, steps per revolation, specific to motor type
         initial_direction: bool, initial direction for initialization of the motor
+        profile_shape: str, "constant", "trapezoid" or "scurve"
+        max_velocity: float, cruise speed limit in steps/s
+        max_acceleration: float, acceleration limit in steps/s^2
+        max_jerk: float, jerk limit in steps/s^3 ("scurve" only)
         Encapsulates a single stepper motor.
     """
         self.index = index
 
-        self.dir_pin = digitalio.DigitalInOut(dir_pin)
-        self.dir_pin.direction = digitalio.Direction.OUTPUT
-        self.dir_pin.value = initial_dir  # default direction
-
-        self.step_pin = digitalio.DigitalInOut(step_pin)
-        self.step_pin.direction = digitalio.Direction.OUTPUT
-        self.step_pin.value = False
+        # Cached outputs: repeated writes of the same level cost nothing
+        self.dir_pin = OutputPin(dir_pin, initial_dir)  # default direction
+        self.step_pin = OutputPin(step_pin, False)
 
         self.steps_per_rev = steps_per_rev
 
+        self.profile_shape = profile_shape
+        self.max_velocity = max_velocity
+        self.max_acceleration = max_acceleration
+        self.max_jerk = max_jerk
+
+        self.timer = EdgeTimer()
+
+    def profile(self, delay: float):
+        """
+        params:
+        delay: float, half delay of the start/stop speed
+        Returns the MotionProfile of this motor, ramping from the `delay` rate
+        up to the motor's velocity limit.
+        """
+        return MotionProfile(
+            self.profile_shape,
+            start_velocity=1.0 / (2 * delay),
+            max_velocity=self.max_velocity,
+            acceleration=self.max_acceleration,
+            jerk=self.max_jerk
+        )
+
     def single_step(self, direction: bool, delay: float):
         """
         params:
@@ -33,27 +57,32 @@ class StepperMotor:
         delay: float, half delay for speed control
         Perform a single step in the specified direction, with the specified delay.
         """
+        self.timer.resume(delay)
         self.dir_pin.value = direction
 
         self.step_pin.value = True
-        time.sleep(delay)
+        self.timer.wait(delay)
 
         self.step_pin.value = False
-        time.sleep(delay)
+        self.timer.wait(delay)
 
     def step(self, direction: bool, steps: int, delay: float):
         """
         params:
         direction: bool, direction of rotation
         steps: int, number of steps
-        delay: float, half delay for speed control
+        delay: float, half delay of the start/stop speed
         Rotate the motor by `steps` steps in the given `direction`,
-        pausing 2 times `delay` seconds between each step.
+        ramping from 2 times `delay` seconds per step up to the motor's
+        velocity limit and back, following the motor's motion profile.
         """
         self.dir_pin.value = direction
+        profile = self.profile(delay)
 
-        for _ in range(steps):
+        self.timer.start()
+        for k in range(steps):
+            half_period = profile.step_period(k, steps) / 2
             self.step_pin.value = True
-            time.sleep(delay)
+            self.timer.wait(half_period)
             self.step_pin.value = False
-            time.sleep(delay)
+            self.timer.wait(half_period)
@@ -0,0 +1,118 @@
+import backend
+
+NS_PER_S = 1_000_000_000
+
+
+class EdgeTimer:
+
+    def __init__(self, clock=None):
+        """
+        params:
+        clock: backend module providing monotonic_ns(), sleep() and
+            SPIN_THRESHOLD_NS, defaults to backend.active
+        Schedules pulse edges against absolute monotonic_ns() deadlines.
+        Each wait advances the deadline by the commanded interval, so time spent
+        on pin writes and bookkeeping between edges is absorbed instead of
+        added to the step period. An edge that is reached after its deadline
+        counts as an overrun; if the timer falls a whole interval behind it
+        resynchronises instead of bursting steps to catch up.
+        """
+        self.clock = clock or backend.active
+        self.monotonic_ns = self.clock.monotonic_ns
+        self.spin_threshold_ns = self.clock.SPIN_THRESHOLD_NS
+        self.deadline_ns = 0
+        self.start_ns = 0
+        self.origin_ns = 0
+        self.lag_ns = 0
+        self.edges = 0
+        self.overruns = 0
+        self.max_overrun_ns = 0
+        self.skipped_ns = 0     # schedule given up by resynchronising
+
+    def start(self):
+        """
+        Anchors the deadline chain at the current time and clears the counters.
+        """
+        self.origin_ns = self.start_ns = self.deadline_ns = self.monotonic_ns()
+        self.lag_ns = 0
+        self.edges = 0
+        self.overruns = 0
+        self.max_overrun_ns = 0
+        self.skipped_ns = 0
+
+    def chain(self, offset_ns: int):
+        """
+        params:
+        offset_ns: int, end of the previous move in ns after start()
+        Anchors the next move at the end of the previous one instead of at the
+        current time, so back-to-back moves keep one deadline chain and the
+        time spent preparing the next move is absorbed. Counters are kept.
+        """
+        self.start_ns += self.lag_ns + offset_ns
+        self.lag_ns = 0
+
+    def resume(self, interval: float):
+        """
+        params:
+        interval: float, seconds until the next edge is due
+        Continues the deadline chain of the previous move if it ended less than
+        one interval ago, otherwise starts a new one.
+        """
+        if self.monotonic_ns() - self.deadline_ns > int(interval * NS_PER_S):
+            self.start()
+
+    def wait(self, interval: float):
+        """
+        params:
+        interval: float, seconds from the previous deadline to the next edge
+        Advances the deadline by `interval` and returns once it is reached.
+        """
+        self._wait_for(self.deadline_ns + int(interval * NS_PER_S))
+
+    def wait_until(self, offset_ns: int):
+        """
+        params:
+        offset_ns: int, time of the next edge in ns after start()
+        Returns once the edge scheduled `offset_ns` after start() is due.
+        Offsets are relative to the start of the move so independent edge
+        streams can share one timer; they must not decrease.
+        """
+        self._wait_for(self.start_ns + self.lag_ns + offset_ns)
+
+    def _wait_for(self, deadline_ns: int):
+        interval_ns = deadline_ns - self.deadline_ns
+        self.deadline_ns = deadline_ns
+        self.edges += 1
+        if interval_ns <= 0:
+            # Simultaneous with the previous edge, which already waited
+            return
+
+        remaining_ns = deadline_ns - self.monotonic_ns()
+        if remaining_ns < 0:
+            self.overruns += 1
+            if -remaining_ns > self.max_overrun_ns:
+                self.max_overrun_ns = -remaining_ns
+            if -remaining_ns > interval_ns:
+                self.skipped_ns -= remaining_ns
+                self.lag_ns -= remaining_ns
+                self.deadline_ns -= remaining_ns
+            return
+
+        if remaining_ns > self.spin_threshold_ns:
+            self.clock.sleep((remaining_ns - self.spin_threshold_ns) / NS_PER_S)
+        while self.monotonic_ns() < deadline_ns:
+            pass
+
+    def elapsed(self):
+        """
+        Returns the scheduled time (in seconds) since start(), including any
+        chained moves.
+        """
+        return (self.deadline_ns - self.origin_ns) / NS_PER_S
+
+    def report(self):
+        """
+        Returns a one-line summary of the edges scheduled since start().
+        """
+        return (f"{self.edges} edges in {self.elapsed():.3f} s, "
+                f"{self.overruns} late (worst {self.max_overrun_ns // 1000} us)")
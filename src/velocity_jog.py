@@ -0,0 +1,136 @@
+import math
+import constant
+from timing import NS_PER_S
+
+
+class VelocityJog:
+
+    def __init__(self, period: float=constant.JOG_PERIOD):
+        """
+        params:
+        period: float, control period in seconds
+        Manual control by velocity. The direction keys held set a target
+        velocity vector (keys held together add up, e.g. diagonally). Every
+        control period the velocity moves toward the target by at most
+        JOG_ACCELERATION * period and the end point of the period follows from
+        it, so the robot speeds up and slows down at a bounded rate, also when
+        the keys are released. Time here is the time of the motion planned,
+        which runs ahead of the motors by the segments buffered.
+        """
+        self.period = period
+        self.period_us = int(period * 1_000_000)
+        self.active = False
+        self.leaving = False    # ends once the robot has stopped
+        self.held = {}          # mode -> time (ns) it counts as released
+        self.position = None    # end of the motion planned so far
+        self.velocity = (0.0, 0.0, 0.0)  # cm/s there
+        self.elapsed_us = 0     # motion time planned since the robot was last at rest
+        self.edge_us = 0        # ... up to the end of the last segment cut
+
+    def start(self, position):
+        self.active = True
+        self.leaving = False
+        self.held = {}
+        self.position = position
+        self.velocity = (0.0, 0.0, 0.0)
+        self.elapsed_us = self.edge_us = 0
+
+    def leave(self):
+        """
+        Releases every key; the jog ends once the robot has stopped.
+        """
+        self.held = {}
+        self.leaving = True
+
+    def moving(self):
+        return self.active and self.velocity != (0.0, 0.0, 0.0)
+
+    def press(self, mode: str, now_ns: int):
+        """
+        params:
+        mode: str, a key of constant.MODE_VECTORS
+        now_ns: int, monotonic time of the key press
+        Holds the key for JOG_HOLD_START, or JOG_HOLD once it repeats.
+        Returns True when the target velocity changed, i.e. the key was not
+        held already.
+        """
+        changed = self.held.get(mode, -1) < now_ns
+        hold = constant.JOG_HOLD_START if changed else constant.JOG_HOLD
+        self.held[mode] = now_ns + int(hold * NS_PER_S)
+        return changed
+
+    def target(self, now_ns: int, speed: float):
+        """
+        Returns the target velocity of the keys still held at `now_ns`, with
+        magnitude `speed` in cm/s.
+        """
+        tx = ty = tz = 0.0
+        for mode in list(self.held):
+            if self.held[mode] < now_ns:
+                del self.held[mode]
+                continue
+            dx, dy, dz = constant.MODE_VECTORS[mode]
+            tx, ty, tz = tx + dx, ty + dy, tz + dz
+        norm = math.sqrt(tx * tx + ty * ty + tz * tz)
+        if norm == 0.0:
+            return (0.0, 0.0, 0.0)
+        scale = speed / norm
+        return (tx * scale, ty * scale, tz * scale)
+
+    def advance(self, now_ns: int, speed: float):
+        """
+        params:
+        now_ns: int, monotonic time, for the keys still held
+        speed: float, cm/s the keys drive the robot at
+        Plans one control period and returns where it ends, or None once the
+        robot is at rest with no key held.
+        """
+        target = self.target(now_ns, speed)
+        vx, vy, vz = self.velocity
+        ex, ey, ez = target[0] - vx, target[1] - vy, target[2] - vz
+        change = math.sqrt(ex * ex + ey * ey + ez * ez)
+        if change == 0.0 and target == (0.0, 0.0, 0.0):
+            self.elapsed_us = self.edge_us = 0
+            return None
+
+        limit = constant.JOG_ACCELERATION * self.period
+        if change > limit:
+            scale = limit / change
+            ex, ey, ez = ex * scale, ey * scale, ez * scale
+        nx, ny, nz = vx + ex, vy + ey, vz + ez
+
+        # Constant acceleration over the period: the mean of both velocities
+        half = 0.5 * self.period
+        x, y, z = self.position
+        self.position = (x + (vx + nx) * half, y + (vy + ny) * half, z + (vz + nz) * half)
+        self.velocity = (nx, ny, nz)
+        self.elapsed_us += self.period_us
+        return self.position
+
+    def cut(self, lead):
+        """
+        params:
+        lead: float, seconds from the end of the period planned last until
+            the master motor's next step is due, or None
+        Ends a segment where that step is due and returns its duration in
+        microseconds. A segment fires its first step as it begins, so cutting
+        where the steps fall carries each period's fraction of a step over to
+        the next instead of bunching the steps together. The lead is at most
+        half a period, which keeps every segment at least that long.
+        """
+        if lead is None or lead > 0.5 * self.period:
+            lead = 0.5 * self.period
+        edge_us = self.elapsed_us + int(lead * 1_000_000)
+        duration_us = edge_us - self.edge_us
+        self.edge_us = edge_us
+        return duration_us
+
+    def state(self):
+        return self.position, self.velocity, self.elapsed_us, self.edge_us
+
+    def restore(self, state):
+        """
+        Goes back to an earlier state(), to plan again from there toward a
+        new target.
+        """
+        self.position, self.velocity, self.elapsed_us, self.edge_us = state
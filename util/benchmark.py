@@ -0,0 +1,361 @@
+#
+# Motion performance benchmarks
+#
+# Drives Controller jogs, a CommandProcessor command sequence, the same
+# sequence typed one command at a time into the cooperative runtime, and
+# random multi-motor moves against the simulated pin backend, and reports per move:
+# achieved steps/s (virtual clock) and host steps/s (CPU time), step-interval
+# histograms, planned versus executed duration, timer overruns, and the
+# Cartesian deviation of the end effector rebuilt from the recorded step
+# streams (forward kinematics) from the commanded straight line.
+# Cable lengths that no position can satisfy show up as large path errors.
+# The runtime run reports segment buffer occupancy and planning underruns.
+#
+#   python util/benchmark.py --output bench_output.txt
+#   python util/benchmark.py --profile scurve --write-cost-us 20
+#
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+# The motion stack lives in src/ and is imported flat, as on the board
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import backend
+import sim_backend
+
+backend.use(sim_backend)
+
+import constant
+import kinematics
+from controller import Controller
+from command_processor import CommandProcessor
+from runtime import Runtime
+
+STEP_LENGTH = constant.SPOOL_CIRCUMFERENCE / constant.STEPS_PER_REV  # cm of cable per step
+
+# Upper edges (in us) of the step-interval histogram bins
+INTERVAL_BINS_US = [100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000]
+
+JOGS = ["forward", "backward", "left", "right", "up", "down"]
+SEQUENCE = "wwaassdd" * 4 + "uunn" * 2
+
+
+def pin_name(pin):
+    return str(pin).split(".")[-1]
+
+
+def distance_to_segment(p, a, b):
+    ab = [b[i] - a[i] for i in range(3)]
+    ap = [p[i] - a[i] for i in range(3)]
+    length_sq = sum(c * c for c in ab)
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, sum(ap[i] * ab[i] for i in range(3)) / length_sq))
+    return math.sqrt(sum((ap[i] - t * ab[i]) ** 2 for i in range(3)))
+
+
+def histogram(intervals_us):
+    counts = {str(edge): 0 for edge in INTERVAL_BINS_US}
+    counts["inf"] = 0
+    for interval in intervals_us:
+        for edge in INTERVAL_BINS_US:
+            if interval <= edge:
+                counts[str(edge)] += 1
+                break
+        else:
+            counts["inf"] += 1
+    return counts
+
+
+class MoveProbe:
+
+    def __init__(self, controller):
+        """
+        Wraps Controller.execute_move, stream_line and update_current_position
+        to capture, for every move or streamed line, the recorded edges, virtual
+        and host time, the planned duration and the commanded start/end
+        positions.
+        """
+        self.controller = controller
+        self.records = []
+        self._execute_move = controller.execute_move
+        self._stream_line = controller.stream_line
+        self._update_position = controller.update_current_position
+        controller.execute_move = self.execute_move
+        controller.stream_line = self.stream_line
+        controller.update_current_position = self.update_current_position
+
+    def execute_move(self, move, coordinated=True):
+        c = self.controller
+        record = {
+            "start": c.current_position,
+            "target": None,
+            "steps": list(move.steps),
+            "dir_levels": {name: motor.dir_pin.value for name, motor in c.motors.items()},
+            "edge_index": len(sim_backend.recorder.edges),
+            "virtual_start_ns": sim_backend.clock.now_ns,
+        }
+        host_start = time.perf_counter()
+        self._execute_move(move, coordinated)
+        record["host_s"] = time.perf_counter() - host_start
+        record["virtual_s"] = (sim_backend.clock.now_ns - record["virtual_start_ns"]) / 1e9
+        record["edges"] = sim_backend.recorder.edges[record["edge_index"]:]
+        record["planned_s"] = max(
+            (profile.duration(steps) for profile, steps in zip(c.profiles, move.steps) if steps),
+            default=0.0
+        )
+        record["overruns"] = c.timer.overruns
+        record["worst_overrun_us"] = c.timer.max_overrun_ns / 1000
+        self.records.append(record)
+
+    def stream_line(self, start, end, master, path_steps, tolerance=None, chain=False, record=None):
+        c = self.controller
+        overruns = c.timer.overruns if chain else 0
+        entry = {
+            "start": start,
+            "target": end,
+            "dir_levels": {name: motor.dir_pin.value for name, motor in c.motors.items()},
+            "edge_index": len(sim_backend.recorder.edges),
+            "virtual_start_ns": sim_backend.clock.now_ns,
+        }
+        host_start = time.perf_counter()
+        result = self._stream_line(start, end, master, path_steps, tolerance, chain, record)
+        entry["host_s"] = time.perf_counter() - host_start
+        entry["virtual_s"] = (sim_backend.clock.now_ns - entry["virtual_start_ns"]) / 1e9
+        entry["edges"] = sim_backend.recorder.edges[entry["edge_index"]:]
+        step_pins = [pin_name(pins["STEP_PIN"]) for pins in constant.MOTOR_PINS.values()]
+        entry["steps"] = [sum(1 for _, pin, value in entry["edges"] if pin == name and value)
+                          for name in step_pins]
+        entry["planned_s"] = master.duration(path_steps)
+        entry["overruns"] = c.timer.overruns - overruns
+        entry["worst_overrun_us"] = c.timer.max_overrun_ns / 1000
+        self.records.append(entry)
+        return result
+
+    def update_current_position(self, new_position):
+        if self.records and self.records[-1]["target"] is None:
+            self.records[-1]["target"] = new_position
+        self._update_position(new_position)
+
+
+def analyse(record, cartesian=True):
+    """
+    Turns one probe record into the machine-readable move report. With
+    `cartesian`, the end effector path is rebuilt from the step streams and
+    compared with the straight line from the start to the commanded target.
+    """
+    names = list(constant.MOTOR_PINS.keys())
+    dir_pins = {pin_name(pins["DIR_PIN"]): name for name, pins in constant.MOTOR_PINS.items()}
+    step_pins = {pin_name(pins["STEP_PIN"]): name for name, pins in constant.MOTOR_PINS.items()}
+    anchors = constant.MOTOR_ANCHORS
+
+    start = record["start"]
+    target = record["target"] or start
+    lengths = [math.dist(anchor, start) for anchor in anchors]
+    dir_levels = dict(record["dir_levels"])
+
+    total_steps = sum(record["steps"])
+    rising = {name: [] for name in names}
+    deviations = []
+    position = start
+    for t, pin, value in record["edges"]:
+        if pin in dir_pins:
+            dir_levels[dir_pins[pin]] = value
+            continue
+        if pin not in step_pins or not value:
+            continue
+        name = step_pins[pin]
+        rising[name].append(t)
+        if not cartesian:
+            continue
+        i = names.index(name)
+        shorten = dir_levels[name] == constant.MOTOR_SHORTEN_RELEASE[name]["shorten"]
+        lengths[i] += -STEP_LENGTH if shorten else STEP_LENGTH
+        # Seed the solve one commanded increment ahead of the last solution,
+        # so a start in the anchor plane leaves it on the commanded side
+        guess = tuple(position[k] + (target[k] - start[k]) / total_steps for k in range(3))
+        position = kinematics.forward_kinematics(anchors, lengths, guess)
+        deviations.append(distance_to_segment(position, start, target))
+
+    intervals = {}
+    for name, times in rising.items():
+        intervals[name] = [(b - a) / 1000 for a, b in zip(times, times[1:])]
+
+    all_intervals = [i for values in intervals.values() for i in values]
+    report = {
+        "steps": dict(zip(names, record["steps"])),
+        "planned_s": record["planned_s"],
+        "virtual_s": record["virtual_s"],
+        "host_s": record["host_s"],
+        "time_error_s": record["virtual_s"] - record["planned_s"],
+        "steps_per_s": total_steps / record["virtual_s"] if record["virtual_s"] else 0.0,
+        "host_steps_per_s": total_steps / record["host_s"] if record["host_s"] else 0.0,
+        "overruns": record["overruns"],
+        "worst_overrun_us": record["worst_overrun_us"],
+        "interval_us": {
+            "min": min(all_intervals, default=0.0),
+            "max": max(all_intervals, default=0.0),
+            "mean": sum(all_intervals) / len(all_intervals) if all_intervals else 0.0,
+        },
+        "interval_histogram_us": {name: histogram(values) for name, values in intervals.items()},
+    }
+    if cartesian:
+        report["path_error_max_cm"] = max(deviations, default=0.0)
+        report["path_error_rms_cm"] = math.sqrt(sum(d * d for d in deviations) / len(deviations)) if deviations else 0.0
+        report["end_error_cm"] = math.dist(position, target)
+    return report
+
+
+def summarise(reports):
+    planned = sum(r["planned_s"] for r in reports)
+    virtual = sum(r["virtual_s"] for r in reports)
+    host = sum(r["host_s"] for r in reports)
+    steps = sum(sum(r["steps"].values()) for r in reports)
+    summary = {
+        "moves": len(reports),
+        "steps": steps,
+        "planned_s": planned,
+        "virtual_s": virtual,
+        "host_s": host,
+        "steps_per_s": steps / virtual if virtual else 0.0,
+        "host_steps_per_s": steps / host if host else 0.0,
+        "overruns": sum(r["overruns"] for r in reports),
+        "worst_overrun_us": max((r["worst_overrun_us"] for r in reports), default=0.0),
+    }
+    if reports and "path_error_max_cm" in reports[0]:
+        summary["path_error_max_cm"] = max(r["path_error_max_cm"] for r in reports)
+    return summary
+
+
+def bench_jogs():
+    reports = {}
+    for jog in JOGS:
+        controller = Controller()
+        probe = MoveProbe(controller)
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller.jog(jog)
+        reports[jog] = analyse(probe.records[0])
+    return {"summary": summarise(list(reports.values())), "moves": reports}
+
+
+def bench_sequence(sequence):
+    processor = CommandProcessor()
+    probe = MoveProbe(processor.controller)
+    host_start = time.perf_counter()
+    virtual_start = sim_backend.clock.now_ns
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.execute_command(sequence)
+    reports = [analyse(record) for record in probe.records]
+    summary = summarise(reports)
+    summary["sequence"] = sequence
+    summary["total_host_s"] = time.perf_counter() - host_start
+    summary["total_virtual_s"] = (sim_backend.clock.now_ns - virtual_start) / 1e9
+    return {"summary": summary, "moves": reports}
+
+
+def bench_pipeline(sequence):
+    """
+    Types the sequence into the runtime one command per line, each arriving
+    on the next serial poll, and reports how well the segment buffer kept
+    the executor fed.
+    """
+    processor = CommandProcessor()
+    runtime = Runtime(processor)
+    lines = [command + "\n" for command in sequence]
+    original = sim_backend.read_input
+    sim_backend.read_input = lambda: lines.pop(0) if lines else None
+    host_start = time.perf_counter()
+    virtual_start = sim_backend.clock.now_ns
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(runtime.run())
+    finally:
+        sim_backend.read_input = original
+    buffer = runtime.buffer
+    return {"summary": {
+        "sequence": sequence,
+        "buffer_size": buffer.capacity,
+        "min_occupancy": buffer.min_occupancy,
+        "underruns": buffer.underruns,
+        "overruns": processor.controller.timer.overruns,
+        "worst_overrun_us": processor.controller.timer.max_overrun_ns / 1000,
+        "total_host_s": time.perf_counter() - host_start,
+        "total_virtual_s": (sim_backend.clock.now_ns - virtual_start) / 1e9,
+        "position": processor.controller.current_position,
+    }}
+
+
+def bench_multi_motor(count, seed):
+    rng = random.Random(seed)
+    controller = Controller()
+    probe = MoveProbe(controller)
+    for _ in range(count):
+        movement_dict = {
+            name: {
+                "direction": rng.random() < 0.5,
+                "steps": rng.randint(0, 400),
+                "delay": constant.DEFAULT_STEP_DELAY,
+            }
+            for name in controller.motors
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            controller.move_motors(movement_dict)
+    # Raw step moves have no Cartesian target, so only timing is meaningful
+    reports = [analyse(record, cartesian=False) for record in probe.records]
+    return {"summary": summarise(reports), "moves": reports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motion performance benchmarks against the simulated backend.")
+    parser.add_argument("--profile", choices=["constant", "trapezoid", "scurve"], default=constant.MOTION_PROFILE,
+                        help="motion profile to benchmark (default: constant.MOTION_PROFILE)")
+    parser.add_argument("--write-cost-us", type=float, default=0.0,
+                        help="virtual time each pin write takes, to model device overhead")
+    parser.add_argument("--read-cost-us", type=float, default=0.0,
+                        help="virtual time each clock read takes")
+    parser.add_argument("--sequence", default=SEQUENCE, help="command sequence for the sequence benchmark")
+    parser.add_argument("--sequence-mode", choices=["polyline", "net"], default=constant.SEQUENCE_MODE,
+                        help="how the sequence is compiled into lines")
+    parser.add_argument("--moves", type=int, default=20, help="number of random multi-motor moves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    constant.MOTION_PROFILE = args.profile
+    constant.SEQUENCE_MODE = args.sequence_mode
+    sim_backend.clock.write_cost_ns = int(args.write_cost_us * 1000)
+    sim_backend.clock.read_cost_ns = int(args.read_cost_us * 1000)
+
+    results = {
+        "config": {
+            "backend": backend.active.NAME,
+            "profile": args.profile,
+            "sequence_mode": args.sequence_mode,
+            "write_cost_us": args.write_cost_us,
+            "read_cost_us": args.read_cost_us,
+            "python": sys.version.split()[0],
+        },
+        "jogs": bench_jogs(),
+        "sequence": bench_sequence(args.sequence),
+        "pipeline": bench_pipeline(args.sequence),
+        "multi_motor": bench_multi_motor(args.moves, args.seed),
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        summary = {name: results[name]["summary"] for name in ("jogs", "sequence", "pipeline", "multi_motor")}
+        print(json.dumps(summary, indent=2))
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
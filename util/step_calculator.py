@@ -1,61 +1,101 @@
-import math
-
-# Unit : cm
-# Define constants for motor positions
-MOTOR_POSITIONS = {
-    "motor0": (0, 0, 30),
-    "motor1": (50, 0, 30),
-    "motor2": (50, 50, 30),
-    "motor3": (0, 50, 30)
-}
-
-# Define initial position of the load
-INITIAL_POSITION = (0, 0, 0)
-
-# Conversion factor (e.g., steps per mm)
-C = 0.1  # Adjust this based on your motor specs
-
-# Define movement modes
-MOVEMENT_MODES = {
-    "forward": (-1, 0, 0),  # -x direction
-    "backward": (1, 0, 0),  # +x direction
-    "left": (0, -1, 0),  # -y direction
-    "right": (0, 1, 0),  # +y direction
-    "up": (0, 0, 1),  # +z direction
-    "down": (0, 0, -1)  # -z direction
-}
-
-def get_current_length(motor_pos, load_pos):
-    """Calculate the initial cable length from motor to load position."""
-    mx, my, mz = motor_pos
-    x, y, z = load_pos
-    return math.sqrt((x - mx) ** 2 + (y - my) ** 2 + (z - mz) ** 2)
-
-def get_target_length(motor_pos, load_pos, delta_x, delta_y, delta_z):
-    """Calculate the target cable length from motor to new load position."""
-    mx, my, mz = motor_pos
-    x, y, z = load_pos
-    return math.sqrt((x + delta_x - mx) ** 2 + (y + delta_y - my) ** 2 + (z + delta_z - mz) ** 2)
-
-def get_difference(current_length, target_length):
-    """Calculate the difference in length for a motor."""
-    return target_length - current_length
-
-def get_steps(delta_length, conversion_factor):
-    """Convert length difference into step count."""
-    return round(delta_length / conversion_factor)
-
-# Compute steps for each movement mode
-for mode, (dx, dy, dz) in MOVEMENT_MODES.items():
-    print(f"Mode: {mode}")
-    step_counts = {}
-    for motor, motor_pos in MOTOR_POSITIONS.items():
-        current_length = get_current_length(motor_pos, INITIAL_POSITION)
-        target_length = get_target_length(motor_pos, INITIAL_POSITION, dx, dy, dz)
-        delta_length = get_difference(current_length, target_length)
-        step_counts[motor] = get_steps(delta_length, C)
-    
-    # Print step results for the mode
-    for motor, step_count in step_counts.items():
-        print(f"  {motor}: {step_count} steps")
-    print()
+#
+# Inverse kinematics lookup table generator
+#
+# Samples the cable length on a regular grid of end effector offsets from an
+# anchor, covering the workspace spanned by constant.MOTOR_ANCHORS down to
+# --depth below them, and writes it as a compact binary table (see
+# src/ik_table.py). Controller interpolates the table instead of solving
+# square roots; copy it next to the code on the board.
+# Reports the table size and the worst interpolation error, before and after
+# the one Newton step the controller polishes every length with.
+#
+#   python util/step_calculator.py
+#   python util/step_calculator.py --resolution 1.0 --output src/ik_table.bin
+#
+import os
+import sys
+import struct
+import argparse
+
+import numpy as np
+
+# The motion stack lives in src/ and is imported flat, as on the board
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+import backend
+import sim_backend
+
+backend.use(sim_backend)
+
+import constant
+import ik_table
+
+
+def grid_lengths(extent, resolution):
+    """
+    params:
+    extent: (x, y, z), largest offset from an anchor along each axis, in cm
+    resolution: float, grid spacing in cm
+    Returns the node offsets along each axis and the cable length at every
+    node, as an (nx, ny, nz) array.
+    """
+    axes = [np.arange(int(np.ceil(e / resolution)) + 2) * resolution for e in extent]
+    x, y, z = np.meshgrid(*axes, indexing="ij")
+    return axes, np.sqrt(x * x + y * y + z * z)
+
+
+def quantize(lengths):
+    """
+    Returns the lengths as unsigned 16-bit table units, and the cm per unit.
+    """
+    scale = float(lengths.max()) / 65535.0
+    return np.rint(lengths / scale).astype("<u2"), scale
+
+
+def interpolation_error(axes, table, scale):
+    """
+    Worst error (in cm) of the trilinear interpolation of the quantized table,
+    taken at cell centres, where it is largest, and the same error after one
+    Newton step on the exact squared length.
+    """
+    values = table.astype(np.float64) * scale
+    centre = sum(values[i:i + values.shape[0] - 1, j:j + values.shape[1] - 1, k:k + values.shape[2] - 1]
+                 for i in (0, 1) for j in (0, 1) for k in (0, 1)) / 8.0
+    x, y, z = np.meshgrid(*(a[:-1] + 0.5 * (a[1] - a[0]) for a in axes), indexing="ij")
+    squared = x * x + y * y + z * z
+    exact = np.sqrt(squared)
+    polished = 0.5 * (centre + squared / centre)
+    return float(np.abs(centre - exact).max()), float(np.abs(polished - exact).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inverse kinematics lookup table generator.")
+    parser.add_argument("--resolution", type=float, default=constant.IK_TABLE_RESOLUTION,
+                        help="grid spacing in cm")
+    parser.add_argument("--depth", type=float, default=max(a[2] for a in constant.MOTOR_ANCHORS),
+                        help="how far below the anchors the workspace reaches, in cm")
+    parser.add_argument("--output", default=os.path.join(SRC, constant.IK_TABLE_FILE),
+                        help="table file to write")
+    args = parser.parse_args()
+
+    anchors = np.array(constant.MOTOR_ANCHORS, dtype=np.float64)
+    extent = (anchors[:, 0].max() - anchors[:, 0].min(),
+              anchors[:, 1].max() - anchors[:, 1].min(),
+              args.depth)
+    axes, lengths = grid_lengths(extent, args.resolution)
+    table, scale = quantize(lengths)
+
+    nx, ny, nz = table.shape
+    with open(args.output, "wb") as file:
+        file.write(struct.pack(ik_table.HEADER, ik_table.MAGIC, nx, ny, nz, args.resolution, scale))
+        file.write(table.tobytes())
+
+    raw, polished = interpolation_error(axes, table, scale)
+    print(f"Wrote {args.output}: {nx} x {ny} x {nz} nodes, {os.path.getsize(args.output)} bytes")
+    print(f"Worst interpolation error: {raw * constant.STEPS_PER_CM:.4f} steps, "
+          f"{polished * constant.STEPS_PER_CM:.6f} steps after one Newton step")
+
+
+if __name__ == "__main__":
+    main()
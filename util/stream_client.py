@@ -0,0 +1,223 @@
+#
+# Host-side client of the binary segment stream
+#
+# Plans a trajectory on the PC, turns it into per-segment signed step counts
+# and streams them to the device (see src/serial_protocol.py), spending one
+# credit per segment and resending from the first frame the device NAKs.
+# The port is the board's USB data port (enabled in boot.py, usually the
+# second /dev/ttyACM*), or the pseudo-terminal the simulator prints at start:
+#
+#   cd src && python main.py                  # prints "Binary stream on /dev/pts/N"
+#   python util/stream_client.py /dev/pts/N --radius 5 --rate 400
+#   python util/stream_client.py /dev/pts/N --corrupt 0.05   # exercise CRC/NAK recovery
+#
+import os
+import sys
+import math
+import time
+import random
+import select
+import struct
+import argparse
+import tty
+
+# The motion stack lives in src/ and is imported flat, as on the board
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import backend
+import sim_backend
+
+backend.use(sim_backend)
+
+import constant
+import kinematics
+import serial_protocol as protocol
+
+RESEND_TIMEOUT = 0.5   # s without an answer before unacknowledged frames are sent again
+
+
+def circle_segments(start, radius, points, turns, rate):
+    """
+    params:
+    start: (x, y, z), where the device is; the circle passes through it
+    radius: float, cm
+    points: int, segments per turn
+    turns: int, number of turns
+    rate: float, segments per second
+    Returns the trajectory as (duration_us, steps) segments, steps one signed
+    count per motor, positive for cable let out. Each point is rounded once
+    from the start lengths, so the counts add up without drift.
+    """
+    anchors = constant.MOTOR_ANCHORS
+    cx, cy, cz = start[0] + radius, start[1], start[2]
+    start_lengths = [kinematics.cable_length(anchor, start) for anchor in anchors]
+    issued = [0] * len(anchors)
+    duration_us = int(1_000_000 / rate)
+    segments = []
+    for k in range(1, points * turns + 1):
+        angle = math.pi + 2.0 * math.pi * k / points
+        point = (cx + radius * math.cos(angle), cy + radius * math.sin(angle), cz)
+        steps = []
+        for i, anchor in enumerate(anchors):
+            target = round((kinematics.cable_length(anchor, point) - start_lengths[i]) * constant.STEPS_PER_CM)
+            steps.append(target - issued[i])
+            issued[i] = target
+        segments.append((duration_us, steps))
+    return segments
+
+
+class StreamClient:
+
+    def __init__(self, path: str, corrupt: float=0.0):
+        """
+        params:
+        path: str, serial device of the data port
+        corrupt: float, fraction of frames sent with a flipped byte, to test
+            recovery
+        """
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        self.decoder = protocol.FrameDecoder()
+        self.corrupt = corrupt
+        self.motor_count = len(constant.MOTOR_ANCHORS)
+
+        self.next_seq = 0       # absolute number of the next frame
+        self.unacked = []       # [absolute seq, frame, segment count], oldest first
+        self.credits = 0
+        self.resend_from = None # NAKed sequence number being resent
+        self.last_heard = time.monotonic()
+        self.status = None
+        self.stats = {"frames": 0, "segments": 0, "resends": 0, "naks": 0}
+
+    def send(self, frame_type, payload=b"", count=0):
+        frame = protocol.encode_frame(frame_type, self.next_seq, payload)
+        self.unacked.append([self.next_seq, frame, count])
+        self.next_seq += 1
+        self.status = None
+        self.write(frame)
+
+    def write(self, frame):
+        if self.corrupt and random.random() < self.corrupt:
+            damaged = bytearray(frame)
+            damaged[random.randrange(1, len(damaged))] ^= 0xFF
+            frame = bytes(damaged)
+        os.write(self.fd, frame)
+        self.stats["frames"] += 1
+
+    def absolute(self, seq):
+        """
+        Maps a 16-bit sequence number onto the frame numbering of the client.
+        """
+        base = self.unacked[0][0] if self.unacked else self.next_seq
+        return base + ((seq - base) & 0xFFFF)
+
+    def poll(self, timeout):
+        """
+        Waits up to `timeout` s for frames from the device and handles them.
+        Resends everything unacknowledged if the device has gone quiet.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            for frame_type, seq, payload in self.decoder.feed(os.read(self.fd, 4096)):
+                self.receive(frame_type, seq, payload)
+            self.last_heard = time.monotonic()
+        elif self.unacked and time.monotonic() - self.last_heard > RESEND_TIMEOUT:
+            self.resend(self.unacked[0][0])
+            self.last_heard = time.monotonic()
+
+    def receive(self, frame_type, seq, payload):
+        if frame_type == protocol.FRAME_ACK:
+            acked = self.absolute(seq)
+            self.unacked = [entry for entry in self.unacked if entry[0] > acked]
+            self.credits += struct.unpack("<H", payload)[0]
+            if self.resend_from is not None and acked >= self.resend_from:
+                self.resend_from = None
+        elif frame_type == protocol.FRAME_CREDIT:
+            self.credits += struct.unpack("<H", payload)[0]
+        elif frame_type == protocol.FRAME_NAK:
+            self.stats["naks"] += 1
+            reason = payload[0]
+            if reason not in (protocol.NAK_CRC, protocol.NAK_SEQUENCE):
+                raise RuntimeError(f"Device refused the stream (NAK reason {reason})")
+            expected = self.absolute(seq)
+            if expected != self.resend_from:
+                # Go back N: every frame from the one expected is sent again,
+                # once per NAK of a new frame
+                self.resend_from = expected
+                self.resend(expected)
+        elif frame_type == protocol.FRAME_STATUS:
+            # Covers every frame before `seq`; only the last one matters
+            if self.absolute(seq) == self.next_seq:
+                self.status = struct.unpack("<" + "l" * self.motor_count, payload)
+
+    def resend(self, first):
+        for entry in self.unacked:
+            if entry[0] >= first:
+                self.write(entry[1])
+                self.stats["resends"] += 1
+
+    def abort(self):
+        """
+        Asks for a controlled stop. ABORT takes no sequence number, so it is
+        not queued behind frames waiting to be resent.
+        """
+        os.write(self.fd, protocol.encode_frame(protocol.FRAME_ABORT, self.next_seq))
+
+    def hello(self):
+        self.credits = 0
+        self.send(protocol.FRAME_HELLO)
+        while self.unacked:
+            self.poll(RESEND_TIMEOUT)
+
+    def stream(self, segments, batch: int):
+        """
+        Sends every segment, at most `batch` per frame and never more than the
+        credits held, then waits for the device to report it has come to rest.
+        """
+        sent = 0
+        while sent < len(segments):
+            # Credits spent on frames the device has not taken yet stay spent
+            count = min(batch, self.credits, len(segments) - sent)
+            if count > 0:
+                payload = protocol.encode_segments(segments[sent:sent + count], self.motor_count)
+                self.send(protocol.FRAME_SEGMENTS, payload, count)
+                self.credits -= count
+                sent += count
+                self.stats["segments"] += count
+                self.poll(0)
+            else:
+                self.poll(RESEND_TIMEOUT)
+        while self.unacked or self.status is None:
+            self.poll(RESEND_TIMEOUT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streams a host-planned trajectory to the device.")
+    parser.add_argument("port", help="serial device of the data port")
+    parser.add_argument("--start", type=float, nargs=3, default=constant.INITIAL_POSITION,
+                        help="position of the device when the stream starts")
+    parser.add_argument("--radius", type=float, default=5.0, help="circle radius in cm")
+    parser.add_argument("--points", type=int, default=200, help="segments per turn")
+    parser.add_argument("--turns", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=200.0, help="segments per second")
+    parser.add_argument("--batch", type=int, default=8, help="segments per frame at most")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="fraction of frames to damage")
+    args = parser.parse_args()
+
+    segments = circle_segments(tuple(args.start), args.radius, args.points, args.turns, args.rate)
+    expected = [sum(steps[i] for _, steps in segments) for i in range(len(constant.MOTOR_ANCHORS))]
+
+    client = StreamClient(args.port, args.corrupt)
+    start = time.monotonic()
+    client.hello()
+    client.stream(segments, args.batch)
+    elapsed = time.monotonic() - start
+
+    print(f"{len(segments)} segments in {client.stats['frames']} frames, {elapsed:.3f} s "
+          f"({len(segments) / elapsed:.0f} segments/s), {client.stats['naks']} NAKs, "
+          f"{client.stats['resends']} frames resent")
+    print(f"Device step counts from home: {list(client.status)}, trajectory: {expected}")
+
+
+if __name__ == "__main__":
+    main()